@@ -0,0 +1,94 @@
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.inmemory import InMemoryBackend
+import asyncio
+import os
+import sqlite3
+import time
+
+from .settings import settings
+
+# memory: private to each process (the old behaviour)
+# sqlite: one file shared by every worker on the same host
+# redis:  shared by every worker and replica
+CACHE_BACKEND = settings.cache_backend
+CACHE_SQLITE_PATH = settings.cache_sqlite_path
+REDIS_URL = settings.redis_url
+
+class SQLiteBackend(Backend):
+    """Small fastapi-cache backend on a local SQLite file, queries run off the event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # WAL so several uvicorn workers can read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _get_with_ttl(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return 0, None
+        value, expires_at = row
+        if expires_at is None:
+            return -1, value
+        ttl = int(expires_at - time.time())
+        if ttl <= 0:
+            return 0, None
+        return ttl, value
+
+    def _set(self, key, value, expire):
+        expires_at = time.time() + expire if expire else None
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, value, expires_at))
+            # Cheap housekeeping so the file doesn't grow forever
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+    def _clear(self, namespace, key):
+        with self._connect() as conn:
+            if namespace:
+                return conn.execute("DELETE FROM cache WHERE key LIKE ?", (f"{namespace}:%",)).rowcount
+            if key:
+                return conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+        return 0
+
+    async def get_with_ttl(self, key):
+        return await asyncio.to_thread(self._get_with_ttl, key)
+
+    async def get(self, key):
+        ttl, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key, value, expire=None):
+        await asyncio.to_thread(self._set, key, value, expire)
+
+    async def clear(self, namespace=None, key=None):
+        return await asyncio.to_thread(self._clear, namespace, key)
+
+def create_backend(name: str = CACHE_BACKEND) -> Backend:
+    if name == "memory":
+        return InMemoryBackend()
+    if name == "sqlite":
+        print(f"Using SQLite cache at {CACHE_SQLITE_PATH}")
+        return SQLiteBackend(CACHE_SQLITE_PATH)
+    if name == "redis":
+        try:
+            from redis import asyncio as aioredis
+            from fastapi_cache.backends.redis import RedisBackend
+        except ImportError:
+            raise ValueError("CACHE_BACKEND=redis needs the redis package installed")
+        print(f"Using Redis cache at {REDIS_URL}")
+        return RedisBackend(aioredis.from_url(REDIS_URL))
+    raise ValueError("Select one of: 'memory', 'sqlite' or 'redis' for CACHE_BACKEND.")
+
+def init_cache():
+    # Only place the cache gets set up, every router shares it
+    FastAPICache.init(create_backend())
@@ -0,0 +1,84 @@
+from fastapi import Request, Response
+from email.utils import formatdate, parsedate_to_datetime
+import orjson
+import time
+
+# Glance polls on a timer but the data only changes a few times a week, so let it
+# revalidate with If-None-Match / If-Modified-Since and get an empty 304 back.
+
+# Best first
+PREFERRED_ENCODINGS = ("br", "gzip", "identity")
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison is what If-None-Match uses, so ignore any W/ prefix and the
+    # per-encoding suffix, the content behind them is the same
+    base = etag.strip('"')
+    candidates = [tag.strip().removeprefix("W/").strip('"').split("-")[0] for tag in header.split(",")]
+    return base in candidates
+
+def _not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except Exception:
+            return False
+    return False
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """Best encoding we have that the client accepts, from its Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    for encoding in PREFERRED_ENCODINGS:
+        if encoding not in available:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 1.0 if encoding == "identity" else 0.0))
+        if q > 0:
+            return encoding
+    return "identity"
+
+def cached_response(request: Request, entry: dict, media_type: str = "application/json",
+                    status_code: int = 200) -> Response:
+    etag = entry.get("etag")
+
+    if not etag:
+        # Errors and anything else that wasn't cached, encode it here
+        value = entry["value"]
+        content = value if isinstance(value, (str, bytes)) else orjson.dumps(value)
+        return Response(content=content, status_code=status_code, media_type=media_type,
+                        headers={"Cache-Control": "no-cache"})
+
+    bodies = entry["bodies"]
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), bodies)
+
+    headers = {
+        # Strong ETags have to differ per encoding
+        "ETag": etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"',
+        "Last-Modified": formatdate(entry["last_modified"], usegmt=True),
+        # Same window the server side cache uses, 0 once we're serving it stale
+        "Cache-Control": f"max-age={max(0, int(entry['fresh_until'] - time.time()))}",
+        "Vary": "Accept-Encoding",
+    }
+
+    if _not_modified(request, etag, entry["last_modified"]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=bodies[encoding], status_code=status_code, media_type=media_type, headers=headers)
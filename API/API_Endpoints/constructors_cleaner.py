@@ -1,91 +1,51 @@
-from fastapi import APIRouter
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
-import pycountry
-import httpx
+from fastapi import APIRouter, Request
+from .upstream import fetch_json, UpstreamError, SNAPSHOT_EXPIRE
+from .swr_cache import get_entry
+from .flags import flag_code
+from .conditional import cached_response
+from .current_race_cleaner import get_next_race_end
+from .settings import settings
 from datetime import datetime, timedelta
-import pytz
-import os
 
 router = APIRouter()
 
-LAST_RACE_API_URL = "http://localhost:4463/f1/next_race/"
+TZ = settings.timezone
+MT = settings.tz
 
-TZ = os.environ.get("TIMEZONE").strip()
-if TZ not in pytz.all_timezones:
-    raise ValueError('Invalid time zone selection')
-MT = pytz.timezone(TZ)
+def clean_team_name(team_name: str) -> str:
+    # Clean up team names and get rid of standard boilerplate slop
+    for word in ['Formula 1', 'F1', 'Racing', 'Team', 'Scuderia']:
+        team_name = team_name.replace(word, "").strip()
+    return team_name
 
-# Initialize caching
-@router.on_event("startup")
-async def startup():
-    FastAPICache.init(InMemoryBackend())
-
-# The API uses some weird country names that don't match standard
-def country_to_code(country_name: str) -> str:
-    replacements = {
-        "Great Britain": "GB",
-        "United States": "US",
-    }
-    try:
-        country_name = replacements.get(country_name, country_name)
-        return pycountry.countries.lookup(country_name).alpha_2.lower()
-    except Exception:
-        return ""
-
-async def get_next_race_end():
-    async with httpx.AsyncClient() as client:
-        try:
-	   # Use f1_latest API to fetch race time for smart caching
-            r = await client.get(LAST_RACE_API_URL)
-            data = r.json()
-            next_event = data.get("next_event", {})
-            race_dt_str = next_event.get("datetime")
-
-            if race_dt_str:
-                race_dt = datetime.fromisoformat(race_dt_str)
-                race_dt = race_dt.astimezone(MT)
-            return race_dt
-        except Exception as e:
-            print("Error fetching race time:", e)
-            print("Used URL:", LAST_RACE_API_URL)
-    return None
-
-@router.get("/", summary="Fetch current constructors championship")
-async def get_constructors_championship():
-    cache = FastAPICache.get_backend()
-    cache_key = "constructors_championship"
-
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get("https://f1api.dev/api/current/constructors-championship")
-        if response.status_code != 200:
-            return {"error": "Failed to fetch data"}
-
-        data = response.json()
-
-    constructors = data.get("constructors_championship", [])
+def clean_constructors(data):
+    """Slim down an f1api.dev constructors-championship response to what the widget shows"""
     results = []
-    for entry in constructors:
-
-        # Clean up team names and get rid of standard boilerplate slop
+    for entry in data.get("constructors_championship", []):
         team = entry.get("team", {})
-        team_name = team.get("teamName")
-        for word in ['Formula 1', 'F1', 'Racing', 'Team', 'Scuderia']:
-            team_name = team_name.replace(word, "").strip()
         country = team.get("country", "")
         results.append({
-            "team": team_name,
+            "team": clean_team_name(team.get("teamName")),
             "position": entry.get("position"),
             "points": entry.get("points"),
             "wins": entry.get("wins") or 0,
             "country": country,
-            "flag": country_to_code(country),
+            "flag": flag_code(country),
             "wiki": team.get("url")
         })
+    return results
+
+@router.get("/", summary="Fetch current constructors championship")
+async def get_constructors_championship(request: Request):
+    return cached_response(request, await get_entry("constructors_championship", build_constructors_championship))
+
+async def build_constructors_championship():
+    try:
+        data, live = await fetch_json("constructors_championship", "https://f1api.dev/api/current/constructors-championship")
+    except UpstreamError as e:
+        return {"error": f"Failed to fetch data: {e}"}, None
+
+    results = clean_constructors(data)
 
     # Cache until event ends or 1 hour (in case f1/last is down or something
     event_end = await get_next_race_end()
@@ -96,10 +56,14 @@ async def get_constructors_championship():
         expire = 3600
         expiry_dt = datetime.now(MT) + timedelta(hours=1)
 
+    # Came off disk, go back upstream soon rather than sitting on it until the race
+    if not live:
+        expire = SNAPSHOT_EXPIRE
+        expiry_dt = datetime.now(MT) + timedelta(seconds=expire)
+
     response_data = {
         "season": data.get("season"), 
         "cache_expires": expiry_dt.isoformat(),
         "constructors": results}
 
-    await cache.set(cache_key, response_data, expire=expire)
-    return response_data
+    return response_data, expire
@@ -1,113 +1,83 @@
-from fastapi import APIRouter
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
-import httpx
+from fastapi import APIRouter, Request
 from datetime import datetime, timedelta
+import copy
 import pytz
-import os
-import fastf1
+
+from .season_calendar import get_season_calendar, race_start
+from .swr_cache import get_entry, get_or_refresh
+from .conditional import cached_response
+from .settings import settings
+from . import fastf1_cache
 
 router = APIRouter()
 
 # Timezone information
-TZ = os.environ.get("TIMEZONE").strip()
-if TZ not in pytz.all_timezones:
-    raise ValueError('Invalid time zone selection')
-MT = pytz.timezone(TZ)
+TZ = settings.timezone
+MT = settings.tz
 UTC = pytz.utc
 
-@router.on_event("startup")
-async def startup():
-    FastAPICache.init(InMemoryBackend())
-
-# Convert to timezone function
-def convert_to_mt(date_str, time_str):
-    if not date_str or not time_str:
-        return None
-    dt_utc = datetime.strptime(f"{date_str}T{time_str}", "%Y-%m-%dT%H:%M:%SZ")
-    dt_utc = UTC.localize(dt_utc)
-    return dt_utc.astimezone(MT)
+# Seconds to cache next_race for while the event name index is still being built
+NAME_PENDING_EXPIRE = 300
 
 @router.get("/", summary="Fetch next race")
-async def get_next_race():
-    cache = FastAPICache.get_backend()
-    cache_key = "f1:next_race"
+async def get_next_race(request: Request):
+    return cached_response(request, await get_next_race_entry())
 
-    cached = await cache.get(cache_key)
-    if cached:
-        return cached
+async def get_next_race_entry():
+    """next_race with its cache validators, for callers that only decode it when it changed"""
+    return await get_entry("f1:next_race", build_next_race)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            # Get data from current season
-            response = await client.get("https://f1api.dev/api/" + str(datetime.now().year))
-            if response.status_code != 200:
-                return {"error": "Failed to fetch race schedule"}
-            calendar_data = response.json()
-        except Exception as e:
-            return {"error": f"Exception while fetching: {e}"}
+async def get_next_event():
+    """Parsed next_event for other modules' cache expiry, without going back through HTTP"""
+    data = await get_next_race_data()
+    return data.get("next_event")
+
+async def get_next_race_end():
+    try:
+        next_event = await get_next_event()
+        race_dt_str = next_event.get("datetime") if next_event else None
+        if race_dt_str:
+            return datetime.fromisoformat(race_dt_str).astimezone(MT)
+    except Exception as e:
+        print("Error getting next race time:", e)
+    return None
+
+# Shared by the next_race endpoint and the other routers, so nothing loops back to localhost
+async def get_next_race_data():
+    return await get_or_refresh("f1:next_race", build_next_race)
 
-    races = sorted(calendar_data.get("races", []), key=lambda r: r.get("schedule", {}).get("race", {}).get("date", ""))
+async def build_next_race():
+    # Schedule, circuit and distance are already processed once in the shared calendar
+    calendar_data = await get_season_calendar()
+    if "error" in calendar_data:
+        return calendar_data, None
+
+    races = sorted(calendar_data.get("races", []), key=lambda r: race_start(r) or datetime.max.replace(tzinfo=UTC))
 
     # Loop through list in order until find first race with date past today. 
     next_race = None
-    now = datetime.utcnow()
+    now = datetime.now(UTC)
     for race in races:
-        race_date_str = race.get("schedule", {}).get("race", {}).get("date")
-        race_time_str = race.get("schedule", {}).get("race", {}).get("time")
-        if not race_date_str or not race_time_str:
-            continue
-        race_datetime = datetime.strptime(f"{race_date_str}T{race_time_str}", "%Y-%m-%dT%H:%M:%SZ")
-        if race_datetime >= now:
-            next_race = race
+        race_datetime = race_start(race)
+        if race_datetime and race_datetime >= now:
+            # Copy so the name clean up below doesn't leak into the shared calendar
+            next_race = copy.deepcopy(race)
             break
 
     if not next_race:
-        return {"message": "No upcoming race found"}
+        return {"message": "No upcoming race found"}, None
 
-    # Convert schedule times
     schedule = next_race.get("schedule", {})
-    for session, val in schedule.items():
-        if val["date"] and val["time"]:
-            dt_mt = convert_to_mt(val["date"], val["time"])
-            val["date"] = dt_mt.strftime("%Y-%m-%d")
-            val["time"] = dt_mt.strftime("%I%p").replace('0', '')
-            val["datetime_rfc3339"] = dt_mt.isoformat()
 
     # Clean up race name
     year = calendar_data.get("season")
     calendar_round = next_race.get("round")
 
-    event_details = fastf1.get_event(year = year, gp = calendar_round)
-    next_race["raceName"] = event_details.EventName
-
-    # Circuit processing
-    circuit = next_race.get("circuit", {})
-    if "circuitLength" in circuit:
-        try:
-            raw_length = int(circuit["circuitLength"].replace("km", "").strip())
-            circuit["circuitLengthKm"] = raw_length / 1000.0
-        except Exception:
-            circuit["circuitLengthKm"] = None
-
-    # Fastest driver name formatting
-    fastest_driver_id = circuit.get("fastestLapDriverId")
-    if fastest_driver_id:
-        name_parts = fastest_driver_id.replace("_", " ").split(" ")
-        circuit["fastestLapDriverName"] = name_parts[-1].capitalize()
-
-    # Correct laptime formatting 
-    fastest_lap_time = circuit.get("lapRecord")
-    if fastest_lap_time:
-        circuit["lapRecord"] = ".".join(fastest_lap_time.rsplit(":", 1))
-
-    # Compute total distance
-    laps = next_race.get("laps")
-    if laps and circuit.get("circuitLengthKm") is not None:
-        next_race["totalDistanceKm"] = round(laps * circuit["circuitLengthKm"], 2)
-    else:
-        next_race["totalDistanceKm"] = None
-
+    # Official name from the per-season index built in the background. Until it's ready
+    # keep f1api's name, and don't cache that for long so the proper one shows up soon
+    event_name = fastf1_cache.event_name(year, calendar_round)
+    if event_name:
+        next_race["raceName"] = event_name
 
     # Select next event
     def get_datetime(item):
@@ -130,10 +100,7 @@ async def get_next_race():
     }
 
     next_event = None
-    try:
-        detail_level = os.environ.get("EVENT_DETAIL").strip()
-    except Exception:
-        detail_level = 'main'
+    detail_level = settings.event_detail
 
     for session_name, session_data in sorted_schedule:
         event_datetime_str = session_data.get("datetime_rfc3339")
@@ -142,17 +109,14 @@ async def get_next_race():
         if not event_datetime_str:
             continue
 
+        # main: qualifying and races, race: races only, detailed: every session
         if detail_level == "main":
-            print("Showing Quali and Race Events Only")
             if session_name in ('fp1', 'fp2', 'fp3'):
                 continue
         elif detail_level == "race":
-            print("Showing Races Only")
             if session_name not in ('race', 'sprintRace'):
                 continue
-        elif detail_level == "detailed":
-            print("Showing All Events")
-        else:
+        elif detail_level != "detailed":
             raise ValueError("Select one of: 'main', 'race', or 'detailed'. No selection defaults to main.")
 
         try:
@@ -184,6 +148,10 @@ async def get_next_race():
         expiry_dt = datetime.now(MT) + timedelta(hours=1)
         expire = 3600
 
+    if not fastf1_cache.index_ready(year):
+        expire = min(expire, NAME_PENDING_EXPIRE)
+        expiry_dt = min(expiry_dt, datetime.now(MT) + timedelta(seconds=NAME_PENDING_EXPIRE))
+
     # Output data
     response_data = {
         "season": calendar_data.get("season"),
@@ -194,5 +162,4 @@ async def get_next_race():
         "race": [next_race]
     }
 
-    await cache.set(cache_key, response_data, expire=expire)
-    return response_data
+    return response_data, expire
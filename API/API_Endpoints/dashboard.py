@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from collections import OrderedDict
+import asyncio
+import orjson
+
+from .current_race_cleaner import build_next_race
+from .races_cleaner import build_all_races
+from .drivers_cleaner import build_drivers_championship
+from .constructors_cleaner import build_constructors_championship
+from .map.router import build_next_track_map
+from .swr_cache import get_entry, make_etag, compress_body
+from .conditional import cached_response
+from . import single_flight
+
+router = APIRouter()
+
+# Every widget's payload in one request instead of five. Each section is read from the
+# same cache entry its own endpoint uses, so this never fetches anything they wouldn't.
+SECTIONS = {
+    "next_race": ("f1:next_race", build_next_race),
+    "races": ("f1:all_races", build_all_races),
+    "drivers_standings": ("drivers_championship", build_drivers_championship),
+    "constructors_standings": ("constructors_championship", build_constructors_championship),
+    "next_map": ("track_map_svg", build_next_track_map),
+}
+
+# combined ETag -> the spliced body in every encoding. Compressed once when a section
+# changes rather than per request, and only a handful of section combinations get used
+_bodies = OrderedDict()
+MAX_BODIES = 16
+
+def _section_json(entry) -> bytes:
+    # Cached entries already hold the encoded body, splice it in as is
+    if "value" in entry or not entry.get("etag"):
+        return orjson.dumps(entry["value"])
+    body = entry["bodies"]["identity"]
+    # The map is SVG text, so it goes in as a JSON string
+    return orjson.dumps(body.decode("utf-8")) if entry["kind"] == "text" else body
+
+@router.get("/", summary="Fetch several widget payloads in one response")
+async def get_dashboard(request: Request, sections: str = ",".join(SECTIONS)):
+    names = [name.strip() for name in sections.split(",") if name.strip()] or list(SECTIONS)
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        return JSONResponse({"error": f"Unknown sections: {', '.join(unknown)}. Pick from: {', '.join(SECTIONS)}"},
+                            status_code=400)
+    names = list(dict.fromkeys(names))
+
+    entries = await asyncio.gather(*(get_entry(*SECTIONS[name]) for name in names))
+
+    if not all(entry.get("etag") for entry in entries):
+        # Something in there is an error or wasn't cached, don't let clients hold on to it
+        return Response(content=_splice(names, entries), media_type="application/json",
+                        headers={"Cache-Control": "no-cache"})
+
+    # Changes whenever any section does, and fresh only as long as the stalest one
+    etag = make_etag(",".join(f"{name}={entry['etag']}" for name, entry in zip(names, entries)).encode())
+    combined = {
+        "etag": etag,
+        "last_modified": max(entry["last_modified"] for entry in entries),
+        "fresh_until": min(entry["fresh_until"] for entry in entries),
+        "bodies": await _combined_bodies(etag, names, entries),
+    }
+    return cached_response(request, combined)
+
+def _splice(names, entries) -> bytes:
+    return b"{" + b",".join(orjson.dumps(name) + b":" + _section_json(entry)
+                            for name, entry in zip(names, entries)) + b"}"
+
+async def _combined_bodies(etag: str, names, entries):
+    bodies = _bodies.get(etag)
+    if bodies is None:
+        # Dashboards polling together right after a change share one compression, off the loop
+        body = _splice(names, entries)
+        bodies = await single_flight.do(f"dashboard:{etag}", lambda: asyncio.to_thread(compress_body, body),
+                                        "dashboard_body")
+        _bodies[etag] = bodies
+        while len(_bodies) > MAX_BODIES:
+            _bodies.popitem(last=False)
+    _bodies.move_to_end(etag)
+    return bodies
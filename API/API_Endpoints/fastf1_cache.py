@@ -0,0 +1,275 @@
+from datetime import datetime, timedelta, timezone
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+
+from .files import write_atomic
+from .settings import settings
+
+# fastf1 keeps every session it downloads (and its raw HTTP responses) on disk. Left to
+# itself it picks a directory inside the container and never deletes anything, so point
+# it somewhere that can be mounted as a volume and keep it under a size cap.
+FASTF1_CACHE_DIR = settings.fastf1_cache_dir
+FASTF1_CACHE_MAX_MB = settings.fastf1_cache_max_mb
+
+# Season schedules are stored as they came back from fastf1, refetched once a day
+SCHEDULE_MAX_AGE = 24 * 3600
+# A session touched this recently may still be mid-download, never evict it
+IN_USE_SECONDS = 600
+
+# fastf1 also keeps every raw HTTP response (multi-MB position and car data streams
+# included) in one sqlite file. Once a session is parsed its .ff1pkl files are what gets
+# reused, so raw responses only need to live long enough to cover a load and a retry
+HTTP_CACHE_FILE = "fastf1_http_cache.sqlite"
+HTTP_CACHE_MAX_AGE = timedelta(days=1)
+
+_lock = threading.Lock()
+_cache_dir = None
+# year -> (fetched at, EventSchedule)
+_schedules = {}
+# year -> {round: official event name}, read on the event loop so it never touches fastf1
+_event_names = {}
+# Seasons whose index is being built right now, by the startup job or on demand
+_indexing = set()
+# year -> when building its index last failed. Not retried for a while, so being
+# offline doesn't mean a schedule download attempt on every next_race build
+_index_failed = {}
+INDEX_RETRY_SECONDS = 600
+# One schedule load per season at a time, whoever asks for it
+_year_locks = {}
+
+def enable(cache_dir: str = None) -> str:
+    """Point fastf1 at our cache directory, once. Returns the directory in use"""
+    global _cache_dir
+    with _lock:
+        if _cache_dir is None:
+            # fastf1 (and pandas under it) takes a second or two to import, only pay for it here
+            import fastf1
+
+            cache_dir = cache_dir or FASTF1_CACHE_DIR
+            os.makedirs(cache_dir, exist_ok=True)
+            fastf1.Cache.enable_cache(cache_dir)
+            _cache_dir = cache_dir
+        return _cache_dir
+
+def _session_dir(api_path: str):
+    # fastf1 stores a session under its api path minus the leading /static/
+    if _cache_dir is None or not api_path:
+        return None
+    return os.path.join(_cache_dir, api_path.strip("/").split("/", 1)[-1])
+
+def mark_used(api_path: str):
+    """Bump a session's last-used time, eviction goes oldest first"""
+    path = _session_dir(api_path)
+    try:
+        os.makedirs(path, exist_ok=True)
+        os.utime(path)
+    except Exception:
+        pass
+
+def _dir_size(path: str) -> int:
+    """Everything fastf1 keeps except the HTTP cache, which is trimmed by age instead"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if root == path and name.startswith(HTTP_CACHE_FILE):
+                continue
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _sessions():
+    """(last used, size, path) for every cached session: <year>/<event>/<session>"""
+    sessions = []
+    for year in os.listdir(_cache_dir):
+        year_dir = os.path.join(_cache_dir, year)
+        if not re.fullmatch(r"\d{4}", year) or not os.path.isdir(year_dir):
+            continue
+        for event in os.listdir(year_dir):
+            event_dir = os.path.join(year_dir, event)
+            if not os.path.isdir(event_dir):
+                continue
+            for session in os.listdir(event_dir):
+                path = os.path.join(event_dir, session)
+                if not os.path.isdir(path):
+                    continue
+                files = [os.path.join(path, name) for name in os.listdir(path)]
+                last_used = max([os.path.getmtime(path)] + [os.path.getmtime(f) for f in files])
+                sessions.append((last_used, sum(os.path.getsize(f) for f in files), path))
+    return sessions
+
+def _remove_if_empty(path: str):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+def trim_http_cache() -> int:
+    """Drop raw responses older than HTTP_CACHE_MAX_AGE and give the space back. Returns the bytes freed"""
+    path = os.path.join(_cache_dir, HTTP_CACHE_FILE) if _cache_dir else None
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        # Comes with fastf1, which is already imported by the time there's a cache to trim
+        from requests_cache.backends.sqlite import SQLiteCache
+
+        before = os.path.getsize(path)
+        cache = SQLiteCache(path)
+        cache.delete(older_than=HTTP_CACHE_MAX_AGE)
+        cache.responses.vacuum()
+        cache.close()
+        freed = before - os.path.getsize(path)
+    except Exception as e:
+        print(f"fastf1 HTTP cache trim failed: {e}")
+        return 0
+    if freed > 0:
+        print(f"Trimmed {freed / 1024 / 1024:.1f}MB of old responses from the fastf1 HTTP cache")
+    return freed
+
+def enforce_limit(keep: str = None) -> int:
+    """
+    Evict the least recently used sessions until the parsed sessions and schedules fit in
+    FASTF1_CACHE_MAX_MB. The HTTP cache isn't counted, it's trimmed by age first.
+    Returns the bytes freed
+    """
+    if _cache_dir is None:
+        return 0
+    freed = trim_http_cache()
+    if FASTF1_CACHE_MAX_MB <= 0:
+        return freed
+    limit = FASTF1_CACHE_MAX_MB * 1024 * 1024
+    keep_dir = os.path.normpath(_session_dir(keep)) if keep else None
+    try:
+        total = _dir_size(_cache_dir)
+        if total <= limit:
+            return freed
+        evicted = 0
+        now = time.time()
+        for last_used, size, path in sorted(_sessions()):
+            if total - evicted <= limit:
+                break
+            if now - last_used < IN_USE_SECONDS or os.path.normpath(path) == keep_dir:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            evicted += size
+            print(f"fastf1 cache over {FASTF1_CACHE_MAX_MB}MB, evicted {os.path.relpath(path, _cache_dir)}")
+            # Drop the event and season folders once their last session is gone
+            _remove_if_empty(os.path.dirname(path))
+            _remove_if_empty(os.path.dirname(os.path.dirname(path)))
+        freed += evicted
+    except Exception as e:
+        print(f"fastf1 cache eviction failed: {e}")
+    return freed
+
+def _schedule_path(year: int) -> str:
+    return os.path.join(_cache_dir, "schedules", f"{year}.pickle")
+
+def _load_stored_schedule(year: int):
+    path = _schedule_path(year)
+    try:
+        with open(path, "rb") as f:
+            return os.path.getmtime(path), pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Written by another pandas/fastf1 version or cut short, just fetch it again
+        print(f"Ignoring unreadable fastf1 schedule {path}: {e}")
+        return None
+
+def _store_schedule(year: int, schedule):
+    write_atomic(_schedule_path(year), lambda f: pickle.dump(schedule, f))
+
+def get_schedule(year: int, max_age: float = SCHEDULE_MAX_AGE):
+    """
+    fastf1's event schedule for a season: from memory, then disk, and only downloaded
+    when neither is fresh. A failed download falls back to whatever copy we had
+    """
+    year = int(year)
+    enable()
+    with _lock:
+        year_lock = _year_locks.setdefault(year, threading.Lock())
+    with year_lock:
+        entry = _schedules.get(year) or _load_stored_schedule(year)
+        if entry and time.time() - entry[0] < max_age:
+            _schedules[year] = entry
+            return entry[1]
+
+        import fastf1
+        try:
+            schedule = fastf1.get_event_schedule(year)
+        except Exception:
+            if entry:
+                print(f"Couldn't refresh the {year} fastf1 schedule, keeping the stored one")
+                _schedules[year] = entry
+                return entry[1]
+            raise
+        try:
+            _store_schedule(year, schedule)
+        except Exception as e:
+            print(f"Failed to store the {year} fastf1 schedule: {e}")
+        _schedules[year] = (time.time(), schedule)
+        return schedule
+
+def build_event_index(year: int) -> dict:
+    """Round -> official event name for a season, from the stored schedule. Blocking, run it on a thread"""
+    year = int(year)
+    schedule = get_schedule(year)
+    names = {int(row.RoundNumber): row.EventName for row in schedule.itertuples() if row.RoundNumber}
+    _event_names[year] = names
+    return names
+
+def _claim_index(year: int) -> bool:
+    """True if the caller should build this season's index, False if it's done or underway"""
+    with _lock:
+        if year in _event_names or year in _indexing:
+            return False
+        if time.time() - _index_failed.get(year, 0) < INDEX_RETRY_SECONDS:
+            return False
+        _indexing.add(year)
+        return True
+
+def _build_index_quietly(year: int):
+    try:
+        build_event_index(year)
+    except Exception as e:
+        _index_failed[year] = time.time()
+        print(f"Couldn't build the {year} event name index: {e}")
+    finally:
+        with _lock:
+            _indexing.discard(year)
+
+def index_ready(year) -> bool:
+    return year is not None and int(year) in _event_names
+
+def event_name(year, calendar_round):
+    """
+    Official event name if the season's index is built, None otherwise. Never blocks:
+    a missing season gets built in the background for next time
+    """
+    try:
+        year, calendar_round = int(year), int(calendar_round)
+    except (TypeError, ValueError):
+        return None
+    names = _event_names.get(year)
+    if names is None:
+        if _claim_index(year):
+            threading.Thread(target=_build_index_quietly, args=(year,), daemon=True,
+                             name=f"event-index-{year}").start()
+        return None
+    return names.get(calendar_round)
+
+def prepopulate(years=None):
+    """
+    Startup job: make sure this and last season's schedules are stored (the map falls
+    back a year) and indexed by round, then trim the cache if it grew past its cap
+    """
+    season = datetime.now(timezone.utc).year
+    for year in years or [season, season - 1]:
+        if _claim_index(year):
+            _build_index_quietly(year)
+    enforce_limit()
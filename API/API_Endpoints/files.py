@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+def write_atomic(path: str, write, suffix: str = ".tmp") -> None:
+    """
+    Write a file through a temp file in the same directory and swap it into place, so a
+    crash (or a reader racing us) never sees it half written. write gets the open binary file
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,93 @@
+from collections import Counter
+import orjson
+import os
+import unicodedata
+
+# Country / nationality -> ISO 3166 alpha-2 code for the flagcdn images in the widgets.
+# ISO names come from a table generated once from pycountry and shipped next to this
+# file, so nothing loads pycountry's database at runtime. Regenerate it with
+#   python -m API_Endpoints.flags
+CODES_PATH = os.path.join(os.path.dirname(__file__), "flag_codes.json")
+
+# Nationalities f1api.dev gives drivers, past seasons included
+DEMONYMS = {
+    "American": "us", "American-Italian": "us", "Argentine": "ar", "Argentinian": "ar",
+    "Australian": "au", "Austrian": "at", "Azerbaijani": "az", "Bahraini": "bh",
+    "Belgian": "be", "Brazilian": "br", "British": "gb", "Canadian": "ca",
+    "Chilean": "cl", "Chinese": "cn", "Colombian": "co", "Czech": "cz",
+    "Danish": "dk", "Dutch": "nl", "East German": "de", "Emirati": "ae",
+    "English": "gb", "Estonian": "ee", "Finnish": "fi", "French": "fr",
+    "German": "de", "Hungarian": "hu", "Indian": "in", "Indonesian": "id",
+    "Irish": "ie", "Israeli": "il", "Italian": "it", "Japanese": "jp",
+    "Liechtensteiner": "li", "Malaysian": "my", "Mexican": "mx", "Monegasque": "mc",
+    "Moroccan": "ma", "New Zealander": "nz", "Polish": "pl", "Portuguese": "pt",
+    "Qatari": "qa", "Rhodesian": "zw", "Russian": "ru", "Saudi": "sa",
+    "Scottish": "gb", "Singaporean": "sg", "South African": "za", "Spanish": "es",
+    "Swedish": "se", "Swiss": "ch", "Thai": "th", "Turkish": "tr",
+    "Uruguayan": "uy", "Venezuelan": "ve", "Welsh": "gb",
+}
+
+# Country names the API uses that aren't the ISO ones
+ALIASES = {
+    "Great Britain": "gb", "UK": "gb", "England": "gb", "Scotland": "gb", "Wales": "gb",
+    "United States": "us", "USA": "us", "UAE": "ae", "Abu Dhabi": "ae",
+    "Russia": "ru", "South Korea": "kr", "Korea": "kr", "Czech Republic": "cz",
+    "Turkey": "tr", "Vietnam": "vn", "Iran": "ir", "Taiwan": "tw",
+    "Holland": "nl", "Monaco": "mc", "East Germany": "de", "West Germany": "de",
+    "Rhodesia": "zw", "Macau": "mo", "Hong Kong": "hk",
+}
+
+_index = None
+_misses = Counter()
+
+def normalize(name: str) -> str:
+    # Accents, case and spacing shouldn't decide whether a flag shows up
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(name.casefold().replace("-", " ").split())
+
+def generate_codes():
+    """Every ISO name and code pycountry knows, keyed by normalized name"""
+    import pycountry
+
+    codes = {}
+    for country in pycountry.countries:
+        code = country.alpha_2.lower()
+        for attr in ("alpha_2", "alpha_3", "name", "common_name", "official_name"):
+            value = getattr(country, attr, None)
+            if value:
+                codes.setdefault(normalize(value), code)
+    return dict(sorted(codes.items()))
+
+def _load_index():
+    global _index
+    try:
+        with open(CODES_PATH, "rb") as f:
+            index = orjson.loads(f.read())
+    except FileNotFoundError:
+        print(f"{CODES_PATH} missing, building flag codes from pycountry")
+        index = generate_codes()
+    for names in (ALIASES, DEMONYMS):
+        index.update({normalize(name): code for name, code in names.items()})
+    _index = index
+    return index
+
+def flag_code(name: str) -> str:
+    """ISO alpha-2 code (lowercase) for a country name or nationality, "" if unknown"""
+    if not name:
+        return ""
+    index = _index or _load_index()
+    code = index.get(normalize(name))
+    if code is None:
+        if name not in _misses:
+            print(f"No flag code for {name!r}")
+        _misses[name] += 1
+        return ""
+    return code
+
+def get_misses():
+    return dict(_misses)
+
+if __name__ == "__main__":
+    with open(CODES_PATH, "wb") as f:
+        f.write(orjson.dumps(generate_codes(), option=orjson.OPT_INDENT_2) + b"\n")
+    print(f"Wrote {CODES_PATH}")
@@ -0,0 +1,189 @@
+from fastapi import APIRouter, Request
+from datetime import datetime
+import asyncio
+import orjson
+import os
+import sqlite3
+import threading
+import time
+import pytz
+
+from .season_calendar import get_season_calendar_entry, process_race_data
+from .races_cleaner import build_all_races
+from .drivers_cleaner import build_drivers_championship, clean_drivers
+from .constructors_cleaner import build_constructors_championship, clean_constructors
+from .upstream import fetch_json, UpstreamError, UpstreamNotFound
+from .swr_cache import get_entry, entry_value, encode_bodies, make_etag, is_error
+from .conditional import cached_response
+from . import single_flight
+from .settings import settings
+
+router = APIRouter()
+
+TZ = settings.timezone
+
+# Finished seasons never change, so each one is fetched from f1api.dev once, cleaned once
+# and kept in a local SQLite file. After that a request is a primary key lookup.
+HISTORY_DB_PATH = settings.history_db_path
+FIRST_SEASON = 1950
+
+# Nothing to revalidate for a finished season, let clients hold on to it
+HISTORY_MAX_AGE = 7 * 24 * 3600
+
+def clean_races(data, season):
+    processed_races = sorted((process_race_data(race) for race in data.get("races", [])),
+                             key=lambda r: r.get("round", 0))
+    return {
+        "season": data.get("season", season),
+        "championship": data.get("championship"),
+        "timezone": TZ,
+        "total_races": len(processed_races),
+        "races": processed_races
+    }
+
+def clean_drivers_standings(data, season):
+    return {"season": data.get("season", season), "drivers": clean_drivers(data)}
+
+def clean_constructors_standings(data, season):
+    return {"season": data.get("season", season), "constructors": clean_constructors(data)}
+
+# resource -> (upstream url, clean up, cache entry the current season is served from)
+RESOURCES = {
+    "races": ("https://f1api.dev/api/{season}", clean_races,
+              ("f1:all_races", build_all_races)),
+    "drivers_standings": ("https://f1api.dev/api/{season}/drivers-championship", clean_drivers_standings,
+                          ("drivers_championship", build_drivers_championship)),
+    "constructors_standings": ("https://f1api.dev/api/{season}/constructors-championship", clean_constructors_standings,
+                               ("constructors_championship", build_constructors_championship)),
+}
+
+_local = threading.local()
+
+# (fresh_until of the calendar entry it came from, season). Decoding the whole calendar on
+# every request just for its year costs more than the lookup itself, so redo it only when
+# a new calendar has been stored
+_current_season = (None, None)
+
+def _connect():
+    # One connection per worker thread, opening one per lookup costs more than the query
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(HISTORY_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(HISTORY_DB_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Raw upstream responses, so a TIMEZONE change re-cleans instead of re-fetching
+        conn.execute("CREATE TABLE IF NOT EXISTS upstream (season INTEGER, resource TEXT, payload BLOB, "
+                     "PRIMARY KEY (season, resource)) WITHOUT ROWID")
+        # Cleaned and pre-encoded responses, ready to send
+        conn.execute("CREATE TABLE IF NOT EXISTS seasons (season INTEGER, resource TEXT, timezone TEXT, "
+                     "etag TEXT, ingested_at REAL, identity BLOB, gzip BLOB, br BLOB, "
+                     "PRIMARY KEY (season, resource, timezone)) WITHOUT ROWID")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+def _read_entry(season: int, resource: str):
+    row = _connect().execute(
+        "SELECT etag, ingested_at, identity, gzip, br FROM seasons WHERE season = ? AND resource = ? AND timezone = ?",
+        (season, resource, TZ)).fetchone()
+    if row is None:
+        return None
+    etag, ingested_at, identity, gzip_body, br_body = row
+    bodies = {"identity": identity}
+    if gzip_body is not None:
+        bodies["gzip"] = gzip_body
+    if br_body is not None:
+        bodies["br"] = br_body
+    return {"etag": etag, "last_modified": ingested_at, "bodies": bodies}
+
+def _write_entry(season: int, resource: str, entry):
+    conn = _connect()
+    bodies = entry["bodies"]
+    conn.execute("INSERT OR REPLACE INTO seasons VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 (season, resource, TZ, entry["etag"], entry["last_modified"],
+                  bodies["identity"], bodies.get("gzip"), bodies.get("br")))
+    conn.commit()
+
+def _read_upstream(season: int, resource: str):
+    row = _connect().execute("SELECT payload FROM upstream WHERE season = ? AND resource = ?",
+                             (season, resource)).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+def _write_upstream(season: int, resource: str, data):
+    conn = _connect()
+    conn.execute("INSERT OR REPLACE INTO upstream VALUES (?, ?, ?)", (season, resource, orjson.dumps(data)))
+    conn.commit()
+
+async def ingest(season: int, resource: str):
+    """Fetch (only if we never have), clean and store one finished season's resource"""
+    url, clean, _ = RESOURCES[resource]
+
+    data = await asyncio.to_thread(_read_upstream, season, resource)
+    if data is None:
+        try:
+            data, live = await fetch_json(f"{season}_{resource}", url.format(season=season), snapshot=False)
+        except UpstreamNotFound:
+            return {"value": {"error": f"No {resource} data for {season}"}, "status": 404}
+        except UpstreamError as e:
+            return {"value": {"error": f"Failed to fetch {season} {resource}: {e}"}}
+        if not any(isinstance(value, list) and value for value in data.values()):
+            # Don't keep an empty season around forever
+            return {"value": {"error": f"No {resource} data for {season}"}, "status": 404}
+        await asyncio.to_thread(_write_upstream, season, resource, data)
+
+    kind, bodies = await asyncio.to_thread(encode_bodies, clean(data, season))
+    entry = {"etag": make_etag(bodies["identity"]), "last_modified": time.time(), "bodies": bodies}
+    await asyncio.to_thread(_write_entry, season, resource, entry)
+    print(f"Stored {season} {resource} in the history store")
+    return entry
+
+async def current_season() -> int:
+    global _current_season
+    entry = await get_season_calendar_entry()
+    stored_at = entry.get("fresh_until")
+    if stored_at is not None and _current_season[0] == stored_at:
+        return _current_season[1]
+    try:
+        season = int(entry_value(entry)["season"])
+    except (KeyError, TypeError, ValueError):
+        # No calendar right now, don't remember the guess
+        return datetime.now(pytz.utc).year
+    if stored_at is not None:
+        _current_season = (stored_at, season)
+    return season
+
+async def get_season_entry(season: int, resource: str):
+    this_season = await current_season()
+    if season == this_season:
+        # Still changing, same cache entry as the current season endpoints
+        return await get_entry(*RESOURCES[resource][2])
+    if season < FIRST_SEASON or season > this_season:
+        return {"value": {"error": f"No data for season {season}"}, "status": 404}
+
+    entry = await asyncio.to_thread(_read_entry, season, resource)
+    if entry is None:
+        # Several first requests for the same season share one ingest
+        entry = await single_flight.do(f"history:{season}:{resource}", lambda: ingest(season, resource))
+    if "etag" in entry:
+        entry = dict(entry, fresh_until=time.time() + HISTORY_MAX_AGE)
+    return entry
+
+async def _season_response(request: Request, season: int, resource: str):
+    entry = await get_season_entry(season, resource)
+    if is_error(entry.get("value")):
+        return cached_response(request, entry, status_code=entry.get("status", 502))
+    return cached_response(request, entry)
+
+@router.get("/{season}/races", summary="Fetch all races in a season")
+async def get_season_races(request: Request, season: int):
+    return await _season_response(request, season, "races")
+
+@router.get("/{season}/drivers_standings", summary="Fetch a season's drivers championship")
+async def get_season_drivers_standings(request: Request, season: int):
+    return await _season_response(request, season, "drivers_standings")
+
+@router.get("/{season}/constructors_standings", summary="Fetch a season's constructors championship")
+async def get_season_constructors_standings(request: Request, season: int):
+    return await _season_response(request, season, "constructors_standings")
@@ -0,0 +1,39 @@
+import httpx
+
+# One client for the whole app so upstream connections (and TLS sessions) get reused
+# instead of every request paying a fresh handshake to f1api.dev
+_client = None
+# Benchmarks swap in a transport that replays recorded responses, None is the network
+_transport = None
+
+# Only a couple of upstream hosts, so a small pool is plenty
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_client() -> httpx.AsyncClient:
+    """Shared client, created on first use if startup hasn't run (scripts, warm-up jobs)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(http2=_http2_available(), limits=LIMITS, timeout=TIMEOUT, transport=_transport)
+    return _client
+
+def set_transport(transport):
+    """Send upstream calls through another httpx transport from the next client on"""
+    global _transport
+    _transport = transport
+
+async def open_client():
+    get_client()
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
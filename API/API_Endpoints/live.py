@@ -0,0 +1,347 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
+import ast
+import asyncio
+import json
+import orjson
+import threading
+import time
+import pytz
+
+from .season_calendar import get_season_calendar_entry
+from .current_race_cleaner import get_next_race_entry
+from .swr_cache import entry_value
+from .refresh_scheduler import SESSION_LENGTH, DEFAULT_SESSION_LENGTH
+from .settings import settings
+
+router = APIRouter()
+
+UTC = pytz.utc
+
+# One poller feeds every /f1/live subscriber. It only runs while someone is connected,
+# and during a session it tails the file fastf1's live timing client records to, so a
+# hundred open dashboards still cost one upstream connection.
+LIVE_DIR = settings.live_dir
+
+# Replays a recording made with `python -m fastf1.livetiming save` instead of going live,
+# handy for trying the stream outside a race weekend
+LIVE_REPLAY_FILE = settings.live_replay_file
+LIVE_REPLAY_SPEED = settings.live_replay_speed
+
+POLL_SECONDS = 1
+KEEPALIVE_SECONDS = 15
+
+# Start recording a little before a session and keep going a while after it
+RECORD_BEFORE = timedelta(minutes=15)
+RECORD_AFTER = timedelta(minutes=30)
+# Don't hammer the feed if the recorder keeps dying
+RECORDER_RETRY_SECONDS = 60
+
+# Categories we use, the rest (car telemetry, radio...) are skipped before parsing
+CATEGORIES = {"SessionInfo", "SessionStatus", "TrackStatus", "LapCount", "DriverList", "TimingData"}
+
+_subscribers = set()
+_poller = None
+_snapshot = None
+
+# The poller looks at the schedule every second. Both of these are (fresh_until of the cache
+# entry they were worked out from, result), so the calendar and next_race are only decoded
+# again once a new copy has been stored
+_windows = (None, [])
+_next_event = (None, None)
+
+def parse_line(line: str):
+    """(category, message, timestamp) from one recorded live timing line, None if unusable"""
+    line = line.strip()
+    # Lines look like ['Category', {...}, 'timestamp'], skip the ones we don't use before
+    # paying for a parse (car data and positions are most of the file)
+    if line[2:line.find("'", 2)] not in CATEGORIES:
+        return None
+    try:
+        # fastf1 writes the python repr of each message
+        category, message, timestamp = ast.literal_eval(line)
+    except (ValueError, SyntaxError):
+        return None
+    # The initial state comes in as JSON strings rather than objects
+    if isinstance(message, str):
+        try:
+            message = json.loads(message)
+        except json.JSONDecodeError:
+            return None
+    return category, message, timestamp
+
+def _merge(target: dict, update: dict):
+    # Live timing only sends what changed, nested
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+def apply_message(state: dict, category: str, message):
+    if isinstance(message, dict):
+        _merge(state.setdefault(category, {}), message)
+
+def _session_view(state: dict):
+    info = state.get("SessionInfo", {})
+    if not info:
+        return None
+    laps = state.get("LapCount", {})
+    track = state.get("TrackStatus", {})
+    return {
+        "meeting": info.get("Meeting", {}).get("Name"),
+        "name": info.get("Name"),
+        "type": info.get("Type"),
+        "status": state.get("SessionStatus", {}).get("Status"),
+        "track_status": track.get("Message"),
+        "lap": laps.get("CurrentLap"),
+        "total_laps": laps.get("TotalLaps"),
+    }
+
+def _standings_view(state: dict):
+    drivers = state.get("DriverList", {})
+    standings = []
+    for number, line in state.get("TimingData", {}).get("Lines", {}).items():
+        try:
+            position = int(line.get("Position"))
+        except (TypeError, ValueError):
+            continue
+        standings.append({
+            "position": position,
+            "number": number,
+            "driver": (drivers.get(number) or {}).get("Tla", number),
+            "gap": line.get("GapToLeader") or None,
+        })
+    return sorted(standings, key=lambda s: s["position"])
+
+def build_snapshot(state: dict, next_event):
+    return {
+        "session": _session_view(state),
+        "next_event": next_event,
+        "standings": _standings_view(state),
+    }
+
+def standings_changes(previous, current):
+    """Drivers whose position moved between two snapshots"""
+    before = {s["driver"]: s["position"] for s in (previous or {}).get("standings", [])}
+    return [
+        {"driver": s["driver"], "from": before[s["driver"]], "to": s["position"]}
+        for s in current["standings"]
+        if s["driver"] in before and before[s["driver"]] != s["position"]
+    ]
+
+def _parse_timestamp(timestamp: str):
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+class ReplaySource:
+    """Feeds a recorded session back in at LIVE_REPLAY_SPEED x real time"""
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.messages = []
+        last = None
+        with open(path) as f:
+            for message in map(parse_line, f):
+                if message is None:
+                    continue
+                # Initial state lines have no timestamp, they go out with whatever came before
+                last = _parse_timestamp(message[2]) or last
+                self.messages.append((last, message))
+        self.first = next((when for when, message in self.messages if when), None)
+        self.speed = speed
+        self.position = 0
+        self.started = None
+
+    def read(self):
+        if self.started is None:
+            self.started = time.monotonic()
+        replay_time = None
+        if self.first is not None:
+            replay_time = self.first + timedelta(seconds=(time.monotonic() - self.started) * self.speed)
+
+        batch = []
+        while self.position < len(self.messages):
+            when, message = self.messages[self.position]
+            if when is not None and replay_time is not None and when > replay_time:
+                break
+            batch.append(message)
+            self.position += 1
+        return batch
+
+class LiveSource:
+    """Tails the live timing recording, starting the recorder when a session is on"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = None
+        self.offset = 0
+        self.recorder = None
+        self.recorder_started = 0.0
+
+    def _record(self, path: str):
+        from fastf1.livetiming.client import SignalRClient
+        try:
+            # Stops on its own once the feed has been quiet for a while after the session
+            SignalRClient(path, filemode="a", timeout=int(RECORD_AFTER.total_seconds()), no_auth=True).start()
+        except Exception as e:
+            print(f"Live timing recorder stopped: {e}")
+
+    def ensure_recording(self, session_key: str):
+        if self.recorder is not None and self.recorder.is_alive():
+            return
+        if time.monotonic() - self.recorder_started < RECORDER_RETRY_SECONDS:
+            return
+        self.recorder_started = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{session_key}.txt")
+        if path != self.path:
+            self.path, self.offset = path, 0
+        print(f"Recording live timing to {path}")
+        self.recorder = threading.Thread(target=self._record, args=(path,), daemon=True, name="live-timing")
+        self.recorder.start()
+
+    def read(self):
+        if self.path is None or not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        # Only whole lines, the recorder may be half way through one
+        end = chunk.rfind(b"\n") + 1
+        self.offset += end
+        lines = chunk[:end].decode("utf-8", errors="replace").splitlines()
+        return [m for m in map(parse_line, lines) if m is not None]
+
+def session_windows(calendar):
+    """(record from, record until, session key) for every session in the calendar"""
+    windows = []
+    for race in calendar.get("races", []):
+        for session_name, session in (race.get("schedule") or {}).items():
+            start_str = (session or {}).get("datetime_rfc3339")
+            if not start_str:
+                continue
+            start = datetime.fromisoformat(start_str).astimezone(UTC)
+            end = start + SESSION_LENGTH.get(session_name, DEFAULT_SESSION_LENGTH)
+            windows.append((start - RECORD_BEFORE, end + RECORD_AFTER,
+                            f"{calendar.get('season')}_{race.get('round')}_{session_name}"))
+    return windows
+
+async def current_session_key():
+    """Name for the session on right now (give or take the recording margins), else None"""
+    global _windows
+    entry = await get_season_calendar_entry()
+    stored_at = entry.get("fresh_until")
+    if stored_at is not None and _windows[0] == stored_at:
+        windows = _windows[1]
+    else:
+        windows = session_windows(entry_value(entry))
+        if stored_at is not None:
+            _windows = (stored_at, windows)
+    now = datetime.now(UTC)
+    for start, end, session_key in windows:
+        if start <= now <= end:
+            return session_key
+    return None
+
+async def current_next_event():
+    """next_race's next_event, decoded again only when next_race has been rebuilt"""
+    global _next_event
+    entry = await get_next_race_entry()
+    stored_at = entry.get("fresh_until")
+    if stored_at is not None and _next_event[0] == stored_at:
+        return _next_event[1]
+    next_event = entry_value(entry).get("next_event")
+    if stored_at is not None:
+        _next_event = (stored_at, next_event)
+    return next_event
+
+def _next_event_view(next_event):
+    if not next_event or not next_event.get("datetime"):
+        return None
+    start = datetime.fromisoformat(next_event["datetime"])
+    return dict(next_event, seconds_remaining=max(0, int((start - datetime.now(UTC)).total_seconds())))
+
+def _encode_event(event: str, payload) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+def _broadcast(message: bytes):
+    # Same bytes to everyone. Slow readers only ever get the latest state, older ones
+    # are dropped instead of piling up
+    for queue in _subscribers:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+async def poll_loop():
+    global _snapshot
+    source = ReplaySource(LIVE_REPLAY_FILE, LIVE_REPLAY_SPEED) if LIVE_REPLAY_FILE else LiveSource(LIVE_DIR)
+    state = {}
+    recording = None
+    while True:
+        try:
+            if isinstance(source, LiveSource):
+                session_key = await current_session_key()
+                if session_key:
+                    if session_key != recording:
+                        # New session, last one's timing lines don't carry over
+                        state, recording = {}, session_key
+                    source.ensure_recording(session_key)
+
+            for category, message, timestamp in await asyncio.to_thread(source.read):
+                apply_message(state, category, message)
+
+            snapshot = build_snapshot(state, await current_next_event())
+            # Countdown ticks every second, only push when something else changed
+            if snapshot != _snapshot:
+                changes = standings_changes(_snapshot, snapshot)
+                _snapshot = snapshot
+                payload = dict(snapshot, next_event=_next_event_view(snapshot["next_event"]), changes=changes)
+                _broadcast(_encode_event("state", payload))
+        except Exception as e:
+            print(f"Live poller error: {e}")
+        await asyncio.sleep(POLL_SECONDS)
+
+def _subscribe() -> asyncio.Queue:
+    global _poller
+    queue = asyncio.Queue(maxsize=1)
+    _subscribers.add(queue)
+    if _poller is None:
+        _poller = asyncio.create_task(poll_loop())
+    elif _snapshot is not None:
+        # Late joiners get the current state straight away
+        payload = dict(_snapshot, next_event=_next_event_view(_snapshot["next_event"]), changes=[])
+        queue.put_nowait(_encode_event("state", payload))
+    return queue
+
+def _unsubscribe(queue: asyncio.Queue):
+    global _poller, _snapshot
+    _subscribers.discard(queue)
+    if not _subscribers and _poller is not None:
+        # Nobody watching, no reason to keep polling
+        _poller.cancel()
+        _poller = None
+        _snapshot = None
+
+async def _event_stream(queue: asyncio.Queue):
+    try:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line so proxies don't close an idle stream
+                yield b": keepalive\n\n"
+    finally:
+        _unsubscribe(queue)
+
+def stop_poller():
+    """Called from main's shutdown"""
+    if _poller is not None:
+        _poller.cancel()
+
+@router.get("/", summary="Stream live session state (Server-Sent Events)")
+async def get_live(request: Request):
+    return StreamingResponse(_event_stream(_subscribe()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
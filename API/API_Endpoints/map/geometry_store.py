@@ -0,0 +1,46 @@
+import numpy as np
+import orjson
+import os
+import re
+
+from ..files import write_atomic
+from ..settings import settings
+
+# Track layouts barely change, so keep the processed polyline on disk and skip fastf1
+# entirely on later renders (including after a container restart). Mount this as a volume.
+TRACK_STORE_DIR = settings.track_store_dir
+
+def _store_path(year: int, gp: str, session_type: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '_', gp.lower()).strip('_')
+    return os.path.join(TRACK_STORE_DIR, f"{year}_{slug}_{session_type}.npy")
+
+def _features_path(year: int, gp: str, session_type: str) -> str:
+    # Corners and sector splits for the overlays, next to the points they belong to
+    return _store_path(year, gp, session_type)[:-len(".npy")] + ".json"
+
+def load_geometry(year: int, gp: str, session_type: str = "Q"):
+    """Return stored ((N, 2) track points, overlay features) or None if this circuit/season isn't stored yet"""
+    path = _store_path(year, gp, session_type)
+    if not os.path.exists(path):
+        return None
+    try:
+        points = np.load(path, mmap_mode='r', allow_pickle=False)
+    except Exception as e:
+        print(f"Ignoring unreadable track geometry {path}: {e}")
+        return None
+
+    try:
+        with open(_features_path(year, gp, session_type), 'rb') as f:
+            features = orjson.loads(f.read())
+    except Exception:
+        # Stored before overlays existed, the line itself is still fine
+        features = {}
+    return points, features
+
+def save_geometry(year: int, gp: str, session_type: str, points, features=None) -> None:
+    # Features first, a reader that finds the points expects them to be there already
+    write_atomic(_features_path(year, gp, session_type),
+                 lambda f: f.write(orjson.dumps(features or {})), suffix=".json.tmp")
+    write_atomic(_store_path(year, gp, session_type),
+                 lambda f: np.save(f, np.ascontiguousarray(points, dtype=np.float32), allow_pickle=False),
+                 suffix=".npy.tmp")
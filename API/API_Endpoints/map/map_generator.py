@@ -1,45 +1,210 @@
 import fastf1
+try:
+    # Same module fastf1.core uses internally, the public alias warns on import
+    from fastf1 import _api as f1_api
+except ImportError:
+    from fastf1 import api as f1_api
 import numpy as np
 import svgwrite
 from svgwrite.base import Title
 import io
-import os 
-import re
+import threading
 import unicodedata 
 
+from .geometry_store import load_geometry, save_geometry
+from .options import DEFAULT_WIDTH, valid_colour
+from ..metrics import timer
+from .. import fastf1_cache
+from ..settings import settings
+
+MAP_STAGE = "f1_map_stage_duration_seconds"
+
+fastf1_cache.enable()
+
 def remove_accents(input_str):
     nfkd_form = unicodedata.normalize('NFKD', input_str)
     return u"".join([c for c in nfkd_form if not unicodedata.combining(c)])
 
-def generate_track_map_svg(year: int, gp: str, track: str, session_type: str = "Q") -> str:
-    track_color = os.environ['TRACK_COLOUR'].strip()
+def load_fastest_lap_xy(session):
+    """Fastest lap and its X/Y, without loading car data or building telemetry for every driver"""
+    # Lap timing only, this is the small part of the download
+    with timer(MAP_STAGE, stage="session_load"):
+        session.load(laps=True, telemetry=False, weather=False, messages=False)
+        lap = session.laps.pick_fastest()
 
-    match = re.search(r'^#(?:[0-9a-fA-F]{3}){1,2}$', track_color)
+    # The position stream still comes as one file for the whole field, but car data is
+    # skipped entirely and we only keep the rows for one driver inside one lap
+    with timer(MAP_STAGE, stage="telemetry"):
+        pos_data = f1_api.position_data(session.api_path)
+        t0_date = max((d['Date'] - d['Time']).max() for d in pos_data.values()).round('ms')
 
-    if not match:
-        raise ValueError("Not a valid hex string")
+        drv_pos = pos_data[lap['DriverNumber']].copy()
+        drv_pos['SessionTime'] = drv_pos['Date'].dt.round('ms') - t0_date
+        in_lap = (drv_pos['SessionTime'] >= lap['LapStartTime']) & (drv_pos['SessionTime'] <= lap['Time'])
+
+        xy = drv_pos.loc[in_lap, ['X', 'Y', 'SessionTime']].dropna().reset_index(drop=True)
+    return lap, xy
+
+def load_fastest_lap_xy_full(session):
+    """Old full-session path, kept as a fallback and for benchmarking against"""
+    with timer(MAP_STAGE, stage="session_load_full"):
+        session.load(weather=False, messages=False, telemetry=True)
+        lap = session.laps.pick_fastest()
+    with timer(MAP_STAGE, stage="telemetry"):
+        xy = lap.get_telemetry().dropna(subset=["X", "Y"])[['X', 'Y', 'SessionTime']].reset_index(drop=True)
+    return lap, xy
 
+def _sector_splits(lap, xy):
+    """Index of the point closest to where sector 1 and sector 2 ended"""
+    splits = []
+    for column in ('Sector1SessionTime', 'Sector2SessionTime'):
+        split_time = lap.get(column)
+        if split_time is None or split_time != split_time:
+            continue
+        offsets = (xy['SessionTime'] - split_time).abs()
+        splits.append(int(offsets.to_numpy().argmin()))
+    return splits
+
+def load_track_geometry(year: int, gp: str, session_type: str = "Q", full_load: bool = False):
+    """
+    Load the fastest lap from fastf1. Returns its XY points rotated and shifted to the
+    origin, plus the overlay features (corners, sector splits) in the same coordinates
+    """
     # Load data from f1 API
-    session = fastf1.get_session(year, gp, session_type)
+    with timer(MAP_STAGE, stage="event_lookup"):
+        session = fastf1.get_session(year, gp, session_type)
+    fastf1_cache.mark_used(session.api_path)
 
     if gp != remove_accents(session.event.Location) + " " + remove_accents(session.event.Country):
         raise ValueError("Map not matching correctly")
 
-    # I hate this API, please let me load just one drivers telemetry not everything...
-    # SO SO SO SO SO SLOW
-    session.load(weather=False, messages=False, telemetry=True)
-    lap = session.laps.pick_fastest()
-    telemetry = lap.get_telemetry().dropna(subset=["X", "Y"])
-    telemetry.loc[len(telemetry)] = telemetry.iloc[0]
+    loaded = None
+    if not full_load:
+        try:
+            loaded = load_fastest_lap_xy(session)
+        except Exception as e:
+            print(f"Targeted position load failed for {gp} {year}, loading full session: {e}")
+    if loaded is None or loaded[1].empty:
+        loaded = load_fastest_lap_xy_full(session)
+    lap, xy = loaded
+
+    # Corners and rotation come from a separate download
+    with timer(MAP_STAGE, stage="circuit_info"):
+        circuit_info = session.get_circuit_info()
+
+    with timer(MAP_STAGE, stage="rotation"):
+        sectors = _sector_splits(lap, xy)
+
+        # Close the loop
+        xy = xy[['X', 'Y']].copy()
+        xy.loc[len(xy)] = xy.iloc[0]
+
+        # api position data defaults to top is 'north.' This isn't how most maps "look" though,
+        # so they also include a rotation parameter to match standard images
+        angle = (circuit_info.rotation / 180) * np.pi
+        rot_mat = np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
+        rotated = np.dot(xy.to_numpy(dtype=float), rot_mat)
+        origin = rotated.min(axis=0)
+
+        # Corner positions go through the same rotation. Their Angle is which way the label
+        # sits off the track, so that gets turned into a unit vector and rotated too
+        corners = []
+        for _, corner in circuit_info.corners.iterrows():
+            position = np.dot([corner['X'], corner['Y']], rot_mat) - origin
+            corner_angle = corner['Angle'] / 180 * np.pi
+            offset = np.dot([np.cos(corner_angle), np.sin(corner_angle)], rot_mat)
+            label = f"{int(corner['Number'])}{corner['Letter'] or ''}"
+            corners.append([round(float(position[0]), 1), round(float(position[1]), 1), label,
+                            round(float(offset[0]), 3), round(float(offset[1]), 3)])
+
+    # This session's download is done, trim older ones if that took the cache over its cap
+    fastf1_cache.enforce_limit(keep=session.api_path)
+    return rotated - origin, {"corners": corners, "sectors": sectors}
+
+# Each circuit's geometry is only ever loaded once at a time, however many variants
+# are being rendered from it in parallel
+_geometry_locks = {}
+_geometry_locks_guard = threading.Lock()
+
+def get_track_geometry(year: int, gp: str, session_type: str = "Q"):
+    """Stored (points, features) if we have them, otherwise load from fastf1 and store for next time"""
+    stored = load_geometry(year, gp, session_type)
+    if stored is not None:
+        return stored
+
+    with _geometry_locks_guard:
+        lock = _geometry_locks.setdefault((year, gp, session_type), threading.Lock())
+    with lock:
+        # Someone else may have just finished loading it
+        stored = load_geometry(year, gp, session_type)
+        if stored is not None:
+            return stored
+
+        points, features = load_track_geometry(year, gp, session_type)
+        try:
+            save_geometry(year, gp, session_type, points, features)
+        except Exception as e:
+            # Still have the points for this render, just not persisted
+            print(f"Failed to store track geometry for {gp} {year}: {e}")
+        return points, features
+
+# How far (in display pixels) a simplified line may drift from the raw telemetry.
+# 0 keeps every sample, the points still get snapped to the integer grid below
+SIMPLIFY_TOLERANCE = settings.map_simplify_tolerance
+
+# Integer viewbox units per display pixel, 4 gives quarter pixel precision
+GRID_PER_PIXEL = 4
+
+def simplify_polyline(points, tolerance: float):
+    """Ramer-Douglas-Peucker, iterative with each segment's distances done in one numpy pass"""
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        ab = b - a
+        seg_len = np.hypot(ab[0], ab[1])
+        if seg_len == 0:
+            # Closed loop, first and last point are the same
+            dists = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dists = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / seg_len
+
+        i = int(np.argmax(dists))
+        if dists[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return points[keep]
 
-    # api position data defaults to top is 'north.' This isn't how most maps "look" though,
-    # so they also include a rotation parameter to match standard images
-    angle = (session.get_circuit_info().rotation / 180) * np.pi
-    rot_mat = np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
-    rotated = np.dot(telemetry[['X', 'Y']], rot_mat)
+# Corner labels sit this far off the track line, in telemetry units like the stroke widths
+CORNER_LABEL_OFFSET = 120
+CORNER_LABEL_SIZE = 100
 
-    x = rotated[:, 0]
-    y = rotated[:, 1]
+def _corner_labels(features):
+    return [(x + ox * CORNER_LABEL_OFFSET, y + oy * CORNER_LABEL_OFFSET, label)
+            for x, y, label, ox, oy in features.get("corners", [])]
+
+def _fit(points, display_width: int, extra=None):
+    """
+    Scale telemetry units onto the integer grid for this width, returns (scaled points, layout).
+    extra points (overlay labels) are kept inside the frame too
+    """
+    points = np.asarray(points, dtype=float)
+    bounds = points if extra is None or len(extra) == 0 else np.vstack((points, extra))
+    x = bounds[:, 0]
+    y = bounds[:, 1]
 
     # Calculate bounding box
     min_x, max_x = np.min(x), np.max(x)
@@ -54,40 +219,182 @@ def generate_track_map_svg(year: int, gp: str, track: str, session_type: str = "
     # Translate track so it's centered in the viewbox
     viewbox_width = width + 2 * pad_x
     viewbox_height = height + 2 * pad_y
-    x_shift = -min_x + pad_x
-    y_shift = -min_y + pad_y
-    x = x + x_shift
-    y = y + y_shift
+    shift = np.array([-min_x + pad_x, -min_y + pad_y])
 
-    points = list(zip(x, y))
+    # Rescale from telemetry units (1/10 m, ~10k across) onto a small integer grid.
+    # Nobody can see 15 significant digits in a 300px widget
+    grid_width = display_width * GRID_PER_PIXEL
+    scale = grid_width / viewbox_width
 
-    svg_buf = io.StringIO()
+    layout = {
+        "scale": scale,
+        "shift": shift,
+        "grid_width": grid_width,
+        "grid_height": int(np.ceil(viewbox_height * scale)),
+        # Have to sort out aspect ratio since will differ for every track.
+        "display_width": display_width,
+        "display_height": int(display_width * viewbox_height / viewbox_width),
+        # Line and glow were tuned in telemetry units, scale them with the grid so it looks the same
+        "stroke_width": 40 * scale,
+        "glow_inner": 40 * scale,
+        "glow_outer": 70 * scale,
+    }
+    return (points + shift) * scale, layout
+
+def _to_grid(layout, x, y):
+    return (x + layout["shift"][0]) * layout["scale"], (y + layout["shift"][1]) * layout["scale"]
+
+def _track_line(scaled):
+    """Simplified, integer polyline for the track itself"""
+    scaled = simplify_polyline(scaled, SIMPLIFY_TOLERANCE * GRID_PER_PIXEL)
+    quantized = np.rint(scaled).astype(int)
+
+    # Rounding can land neighbours on the same cell, no point writing them twice
+    repeats = np.all(quantized[1:] == quantized[:-1], axis=1)
+    quantized = quantized[np.concatenate(([True], ~repeats))]
+    return [(int(px), int(py)) for px, py in quantized]
+
+def _start_line(scaled, layout):
+    """Short line across the track at the start/finish, the lap begins there"""
+    x0, y0 = scaled[0]
+    # Direction of travel from the first point far enough away to be meaningful
+    ahead = scaled[np.hypot(*(scaled - scaled[0]).T) > layout["stroke_width"]]
+    if len(ahead) == 0:
+        return None
+    dx, dy = ahead[0] - scaled[0]
+    norm = np.hypot(dx, dy)
+    half = layout["stroke_width"] * 1.5
+    nx, ny = -dy / norm * half, dx / norm * half
+    return (x0 - nx, y0 - ny), (x0 + nx, y0 + ny)
 
-    # Match column: small in glance, but probably shouldnt if wanna use in main
-    display_width = 300
+def _label_bounds(features, overlays):
+    """Corners of every label's box, so _fit leaves room for them"""
+    if "corners" not in overlays:
+        return None
+    half = CORNER_LABEL_SIZE / 2
+    return np.array([(x + dx, y + dy) for x, y, label in _corner_labels(features)
+                     for dx in (-half * len(label), half * len(label)) for dy in (-half, half)])
 
-    # Have to sort out aspect ratio since will differ for every track. 
-    aspect_ratio = viewbox_height/viewbox_width
-    display_height = int(display_width * aspect_ratio)
+def _overlay_marks(scaled, layout, features, overlays):
+    """Everything the overlays draw, in grid units, shared by the SVG and raster renderers"""
+    marks = {"corners": [], "sectors": [], "start": None}
+    if "corners" in overlays:
+        for x, y, label in _corner_labels(features):
+            marks["corners"].append(_to_grid(layout, x, y) + (label,))
+    if "sectors" in overlays:
+        marks["sectors"] = [tuple(scaled[i]) for i in features.get("sectors", []) if i < len(scaled)]
+    if "start" in overlays:
+        marks["start"] = _start_line(scaled, layout)
+    return marks
+
+def render_track_svg(points, track: str, track_color: str, display_width: int = DEFAULT_WIDTH,
+                     features=None, overlays=()) -> str:
+    features = features or {}
+    scaled, layout = _fit(points, display_width, _label_bounds(features, overlays))
+    line = _track_line(scaled)
+    marks = _overlay_marks(scaled, layout, features, overlays)
+
+    svg_buf = io.StringIO()
     dwg = svgwrite.Drawing(svg_buf, profile='full',
-                           size=(f"{display_width}px", f"{display_height}px"),
-                           viewBox=f"0 0 {viewbox_width} {viewbox_height}",
+                           size=(f"{layout['display_width']}px", f"{layout['display_height']}px"),
+                           viewBox=f"0 0 {layout['grid_width']} {layout['grid_height']}",
                            preserveAspectRatio="xMidYMid meet")
 
-    track_class = 'track-line'
-    # Have to have a super thick line
+    stroke_width = round(layout["stroke_width"], 2)
+
+    # Glow used to be two CSS drop-shadow filters, which browsers re-blur on every paint.
+    # Wide translucent strokes underneath look close enough and cost nothing to draw
     dwg.defs.add(dwg.style(f"""
-        .{track_class} {{
-            fill: transparent;
-            stroke: {track_color};
-            stroke-width: 40;
-            title: {track};
-            filter: drop-shadow(0 0 40px white), drop-shadow(0 0 70px {track_color});
-        }}"""))
-
-    polyline = dwg.polyline(points=points, class_=track_class, fill='none')
+        .track-glow-outer {{ fill: none; stroke: {track_color}; stroke-opacity: 0.25; stroke-width: {round(stroke_width + 2 * layout['glow_outer'], 2)}; stroke-linejoin: round; }}
+        .track-glow-inner {{ fill: none; stroke: white; stroke-opacity: 0.35; stroke-width: {round(stroke_width + layout['glow_inner'], 2)}; stroke-linejoin: round; }}
+        .track-line {{ fill: none; stroke: {track_color}; stroke-width: {stroke_width}; stroke-linejoin: round; }}
+        .track-mark {{ fill: white; stroke: {track_color}; stroke-width: {round(stroke_width / 3, 2)}; }}
+        .track-corner {{ fill: white; font-family: sans-serif; font-size: {round(CORNER_LABEL_SIZE * layout['scale'], 2)}px; text-anchor: middle; dominant-baseline: central; }}"""))
+
+    for track_class in ('track-glow-outer', 'track-glow-inner'):
+        dwg.add(dwg.polyline(points=line, class_=track_class))
+    polyline = dwg.polyline(points=line, class_='track-line')
     polyline.elements.append(Title(track))
     dwg.add(polyline)
+
+    if marks["start"]:
+        (x1, y1), (x2, y2) = marks["start"]
+        dwg.add(dwg.line(start=(round(x1), round(y1)), end=(round(x2), round(y2)), stroke="white",
+                         stroke_width=round(stroke_width / 2, 2)))
+    for x, y in marks["sectors"]:
+        dwg.add(dwg.circle(center=(round(x), round(y)), r=stroke_width, class_='track-mark'))
+    for x, y, label in marks["corners"]:
+        dwg.add(dwg.text(label, insert=(round(x), round(y)), class_='track-corner'))
+
     dwg.write(svg_buf)
 
     return svg_buf.getvalue()
+
+def _hex_to_rgb(track_color: str):
+    track_color = track_color.lstrip('#')
+    if len(track_color) == 3:
+        track_color = "".join(c * 2 for c in track_color)
+    return tuple(int(track_color[i:i + 2], 16) for i in (0, 2, 4))
+
+def render_track_raster(points, track_color: str, display_width: int = DEFAULT_WIDTH, features=None,
+                        overlays=(), image_format: str = "png") -> bytes:
+    """Same drawing as the SVG, as a PNG or WebP for clients that can't show SVG"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    features = features or {}
+    scaled, layout = _fit(points, display_width, _label_bounds(features, overlays))
+    marks = _overlay_marks(scaled, layout, features, overlays)
+
+    # Draw at 2x and shrink for anti-aliasing, PIL lines are hard edged
+    supersample = 2
+    to_px = supersample / GRID_PER_PIXEL
+    size = (layout["display_width"] * supersample, max(layout["display_height"], 1) * supersample)
+    line = [(x * to_px, y * to_px) for x, y in _track_line(scaled)]
+    rgb = _hex_to_rgb(track_color)
+    stroke = max(1, round(layout["stroke_width"] * to_px))
+
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    for color, width in ((rgb + (64,), stroke + 2 * layout["glow_outer"] * to_px),
+                         ((255, 255, 255, 90), stroke + layout["glow_inner"] * to_px),
+                         (rgb + (255,), stroke)):
+        # Each layer on its own so the translucent ones blend instead of overwriting
+        layer = Image.new("RGBA", size, (0, 0, 0, 0))
+        ImageDraw.Draw(layer).line(line, fill=color, width=max(1, round(width)), joint="curve")
+        image = Image.alpha_composite(image, layer)
+
+    draw = ImageDraw.Draw(image)
+    if marks["start"]:
+        (x1, y1), (x2, y2) = marks["start"]
+        draw.line([(x1 * to_px, y1 * to_px), (x2 * to_px, y2 * to_px)], fill="white", width=max(1, stroke // 2))
+    for x, y in marks["sectors"]:
+        r = stroke
+        draw.ellipse([x * to_px - r, y * to_px - r, x * to_px + r, y * to_px + r], fill="white", outline=rgb,
+                     width=max(1, stroke // 3))
+    if marks["corners"]:
+        font = ImageFont.load_default(size=max(8, round(CORNER_LABEL_SIZE * layout["scale"] * to_px)))
+        for x, y, label in marks["corners"]:
+            draw.text((x * to_px, y * to_px), label, fill="white", font=font, anchor="mm")
+
+    image = image.resize((layout["display_width"], max(layout["display_height"], 1)), Image.LANCZOS)
+    buf = io.BytesIO()
+    if image_format == "webp":
+        image.save(buf, format="WEBP", lossless=True)
+    else:
+        image.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+def generate_track_map(year: int, gp: str, track: str, session_type: str = "Q", image_format: str = "svg",
+                       display_width: int = DEFAULT_WIDTH, track_color: str = None, overlays=()):
+    """Rendered map, SVG text or PNG/WebP bytes. Every variant comes from the same stored geometry"""
+    track_color = track_color or settings.track_colour
+
+    if not valid_colour(track_color):
+        raise ValueError("Not a valid hex string")
+
+    points, features = get_track_geometry(year, gp, session_type)
+    with timer(MAP_STAGE, stage=f"render_{image_format}"):
+        if image_format == "svg":
+            rendered = render_track_svg(points, track, track_color, display_width, features, overlays)
+        else:
+            rendered = render_track_raster(points, track_color, display_width, features, overlays, image_format)
+    return rendered
@@ -0,0 +1,25 @@
+import re
+
+# What a map request can ask for. Kept apart from map_generator so the router can check
+# requests without importing fastf1, numpy and svgwrite at startup
+
+# Match column: small in glance, but probably shouldnt if wanna use in main
+DEFAULT_WIDTH = 300
+FORMATS = ("svg", "png", "webp")
+# Widths a map is actually rendered at. Anything else is rounded up to the next one, so
+# a client can't make a new render (and cache entry) for every pixel between 50 and 2000
+SIZES = (100, 150, 200, 300, 400, 600, 800, 1200, 1600, 2000)
+OVERLAYS = ("corners", "sectors", "start")
+
+def valid_colour(track_color: str) -> bool:
+    return re.search(r'^#(?:[0-9a-fA-F]{3}){1,2}$', track_color) is not None
+
+def snap_size(size: int) -> int:
+    return next((bucket for bucket in SIZES if bucket >= size), SIZES[-1])
+
+def normalise_colour(track_color: str) -> str:
+    """#abc and #AABBCC are the same colour, keep them the same cache key too"""
+    digits = track_color.lstrip("#").lower()
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    return "#" + digits
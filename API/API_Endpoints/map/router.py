@@ -1,73 +1,138 @@
-from fastapi import APIRouter, Response
-from fastapi.responses import PlainTextResponse, StreamingResponse
-import httpx
-import io
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import PlainTextResponse
+from ..current_race_cleaner import get_next_race_data
+from ..swr_cache import get_entry, is_error, forget
+from ..conditional import cached_response
+from .. import single_flight, fastf1_cache
+from collections import OrderedDict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import pytz
-import os
+from functools import partial
 
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
-from .map_generator import generate_track_map_svg
+from .options import valid_colour, normalise_colour, snap_size, DEFAULT_WIDTH, FORMATS, OVERLAYS
+from .warmup import map_years, warm_in_background, MAP_WARMUP
+from ..settings import settings
 
 router = APIRouter()
 
-# Use our internal API endpoint instead of external API
-NEXT_RACE_API_URL = "http://localhost:4463/f1/next_race/"
-
-TZ = os.environ.get("TIMEZONE").strip()
-if TZ not in pytz.all_timezones:
-    raise ValueError('Invalid time zone selection')
-MT = pytz.timezone(TZ)
-
-@router.on_event("startup")
-# Initialize caching
-async def startup():
-    FastAPICache.init(InMemoryBackend())
-
-async def get_next_race_end():
-    async with httpx.AsyncClient() as client:
-        try:
-            # Use our internal next race API to fetch race time for smart caching
-            r = await client.get(NEXT_RACE_API_URL)
-            r.raise_for_status()
-            data = r.json()
-            
-            # Extract race time from our internal API response format
-            race_data = data.get("race", [])
-            if race_data:
-                race_dt_str = race_data[0].get("schedule", {}).get("race", {}).get("datetime_rfc3339")
-                if race_dt_str:
-                    race_dt = datetime.fromisoformat(race_dt_str)
-                    race_dt = race_dt.astimezone(MT)
-                    return race_dt
-        except Exception as e:
-            print("Error fetching race time:", e)
-            print("Used URL:", NEXT_RACE_API_URL)
-    return None
+TZ = settings.timezone
+MT = settings.tz
+
+# fastf1 loads take tens of seconds, so they run on a small worker pool instead of
+# blocking the event loop (and every other endpoint with it)
+MAP_WORKERS = settings.map_workers
+map_executor = ThreadPoolExecutor(max_workers=MAP_WORKERS, thread_name_prefix="track-map")
+
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png", "webp": "image/webp"}
+MIN_WIDTH, MAX_WIDTH = 50, 2000
+
+# Most map variants kept in the cache at once, the default map doesn't count. Past this
+# the least recently requested one is dropped, so random colours can't fill the cache
+MAP_MAX_VARIANTS = settings.map_max_variants
+_variants = OrderedDict()
+
+async def _use_variant(cache_key: str):
+    if cache_key == "track_map_svg":
+        return
+    _variants[cache_key] = None
+    _variants.move_to_end(cache_key)
+    while len(_variants) > MAP_MAX_VARIANTS:
+        oldest, _ = _variants.popitem(last=False)
+        await forget(oldest)
+
+def variant_key(options) -> str:
+    """Cache key for one rendered variant, the default one keeps the original key"""
+    if not options:
+        return "track_map_svg"
+    return "track_map:" + ":".join(
+        f"{name}={','.join(value) if isinstance(value, tuple) else value}" for name, value in sorted(options.items()))
+
+def import_map_stack():
+    # fastf1, pandas, numpy and svgwrite take a couple of seconds to import. Done on the
+    # map pool after startup, so the server is answering before they're loaded
+    from . import map_generator
+    return map_generator
+
+def render_track_map(*args, **options):
+    return import_map_stack().generate_track_map(*args, **options)
+
+async def build_track_map(year: int, gp: str, track: str, session_type: str = "Q", **options):
+    # Concurrent requests for the same (year, gp, session, variant) share one render, and
+    # every variant shares the one stored geometry, so a new variant never reloads fastf1
+    loop = asyncio.get_running_loop()
+    return await single_flight.do(
+        f"track_map:{year}:{gp}:{session_type}:{variant_key(options)}",
+        lambda: loop.run_in_executor(map_executor, partial(render_track_map, year, gp, track, session_type, **options)),
+        f"track_map:{year}:{gp}:{session_type}")
+
+_warmup_task = None
+
+# Started and stopped from main's startup/shutdown: router level on_event handlers can
+# run twice on newer FastAPI, which would mean two warm-ups loading every circuit at once
+def start_map_background():
+    global _warmup_task
+    map_executor.submit(import_map_stack)
+    # Schedules fastf1 looks events up in, so neither next_race nor a map load waits on them
+    map_executor.submit(fastf1_cache.prepopulate)
+    if MAP_WARMUP and _warmup_task is None:
+        _warmup_task = asyncio.create_task(warm_in_background())
+
+def stop_map_background():
+    global _warmup_task
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        _warmup_task = None
+    map_executor.shutdown(wait=False, cancel_futures=True)
 
 @router.get("/", summary="Fetch next track map")
-async def get_dynamic_track_map():
-    cache_key = "track_map_svg"
-    cache = FastAPICache.get_backend()
-
-    # Try cached version
-    svg_content = await cache.get(cache_key)
-    if svg_content:
-        return Response(content=svg_content, media_type="image/svg+xml")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(NEXT_RACE_API_URL)
-            resp.raise_for_status()
-        except Exception as e:
-            print("Fetch error:", e)
-            print("URL:", NEXT_RACE_API_URL)
-            return PlainTextResponse(f"Failed to fetch race info: {str(e)}", status_code=502)
-        
+async def get_dynamic_track_map(request: Request,
+                                size: int = Query(DEFAULT_WIDTH, description="Width in pixels"),
+                                image_format: str = Query("svg", alias="format", description="svg, png or webp"),
+                                colour: str = Query(None, description="Hex track colour, defaults to TRACK_COLOUR"),
+                                overlays: str = Query("", description="Comma separated: corners, sectors, start")):
+    options = {}
+    if size != DEFAULT_WIDTH:
+        if not MIN_WIDTH <= size <= MAX_WIDTH:
+            return PlainTextResponse(f"size must be between {MIN_WIDTH} and {MAX_WIDTH}", status_code=400)
+        size = snap_size(size)
+        if size != DEFAULT_WIDTH:
+            options["display_width"] = size
+    image_format = image_format.lower()
+    if image_format not in FORMATS:
+        return PlainTextResponse(f"format must be one of: {', '.join(FORMATS)}", status_code=400)
+    if image_format != "svg":
+        options["image_format"] = image_format
+    if colour:
+        colour = "#" + colour.lstrip("#").lower()
+        if not valid_colour(colour):
+            return PlainTextResponse("colour must be a hex colour like e10600", status_code=400)
+        options["track_color"] = normalise_colour(colour)
+    selected = sorted({name.strip().lower() for name in overlays.split(",") if name.strip()})
+    unknown = [name for name in selected if name not in OVERLAYS]
+    if unknown:
+        return PlainTextResponse(f"Unknown overlays: {', '.join(unknown)}. Pick from: {', '.join(OVERLAYS)}", status_code=400)
+    if selected:
+        options["overlays"] = tuple(selected)
+
+    cache_key = variant_key(options)
+    await _use_variant(cache_key)
+    entry = await get_entry(cache_key, partial(build_next_track_map, **options))
+    # Only uncached results carry a value, cached hits are just the stored bytes
+    error = entry.get("value")
+    if is_error(error):
+        return PlainTextResponse(error["error"], status_code=error.get("status", 500))
+
+    return cached_response(request, entry, media_type=MEDIA_TYPES[image_format])
+
+async def build_next_track_map(**options):
+    # Same in-process lookup (and cache) the next_race endpoint uses
+    data = await get_next_race_data()
+    if "error" in data:
+        print("Fetch error:", data["error"])
+        return {"error": f"Failed to fetch race info: {data['error']}", "status": 502}, None
 
     try:
-        data = resp.json()
         race_data = data.get("race", [])
         if not race_data:
             raise ValueError("No race data found in API response")
@@ -100,25 +165,21 @@ async def get_dynamic_track_map():
             print("Cache expiry fallback due to error:", e)
             expire = 3600  # fallback: 1 hour if can't fetch next race data
 
-        print(f"Cache expired: Fetching track map for {gp} {year}")
-        try:
-            svg_content = generate_track_map_svg(year, gp, circuit.get("circuitName", "Unknown Circuit"), "Q")
-        except Exception as e:
-            print(f"Map generation error for {year}: {str(e)}")
-            # Fallback to previous year if current year data doesn't exist (common for future seasons)
-            if year > 2024:
-                print(f"Trying fallback year {year-1} for {gp}")
-                try:
-                    svg_content = generate_track_map_svg(year-1, gp, circuit.get("circuitName", "Unknown Circuit"), "Q")
-                except Exception as fallback_e:
-                    print(f"Fallback map generation error: {str(fallback_e)}")
-                    return PlainTextResponse(f"Could not generate track map for {year} or {year-1}: {str(e)} / {str(fallback_e)}", status_code=500)
-            else:
-                return PlainTextResponse(f"Could not generate track map: {str(e)}", status_code=500)
-        svg_bytes = svg_content.encode("utf-8")
-        await cache.set(cache_key, svg_content, expire=expire)
-
-        return StreamingResponse(io.BytesIO(svg_bytes), media_type="image/svg+xml")
+        # Falls back to the previous year if this year's data doesn't exist (common for
+        # future seasons), skipping straight to it before qualifying has run
+        errors = []
+        for map_year in map_years(year, next_race):
+            try:
+                svg_content = await build_track_map(map_year, gp, circuit.get("circuitName", "Unknown Circuit"), "Q", **options)
+                break
+            except Exception as e:
+                print(f"Map generation error for {map_year}: {str(e)}")
+                errors.append((map_year, str(e)))
+        else:
+            return {"error": "Could not generate track map for " + " or ".join(str(y) for y, _ in errors)
+                             + ": " + " / ".join(e for _, e in errors)}, None
+
+        return svg_content, expire
 
     except Exception as e:
-        return PlainTextResponse(f"Failed to generate SVG: {str(e)}", status_code=500)
+        return {"error": f"Failed to generate SVG: {str(e)}"}, None
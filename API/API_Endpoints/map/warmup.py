@@ -0,0 +1,134 @@
+"""
+Generate and store track geometry for every circuit on the season calendar, so no
+request ever waits on a cold fastf1 load.
+
+    python -m API_Endpoints.map.warmup [--workers 4] [--json results.json]
+
+Set MAP_WARMUP=on to also run it in the background at startup.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import pytz
+
+from ..settings import settings
+
+MAP_WARMUP = settings.map_warmup
+WARMUP_WORKERS = settings.map_warmup_workers
+
+# Seasons before this don't get a previous-year fallback, same as the map endpoint always did
+FALLBACK_FROM = 2025
+
+def circuit_gp(race) -> str:
+    """The "City Country" name fastf1 matches events on"""
+    circuit = race.get("circuit", {})
+    return f"{circuit.get('city', '')} {circuit.get('country', '')}".strip()
+
+def map_years(season: int, race, now=None):
+    """
+    Seasons to take this race's layout from, in order. Until qualifying has run there's
+    no data for this year yet, so don't bother asking fastf1 and go to last year's
+    """
+    now = now or datetime.now(pytz.utc)
+    fallback = [season - 1] if season >= FALLBACK_FROM else []
+    qualy_str = (race.get("schedule", {}).get("qualy") or {}).get("datetime_rfc3339")
+    if qualy_str and datetime.fromisoformat(qualy_str) > now and fallback:
+        return fallback
+    return [season] + fallback
+
+def warm_circuit(years, gp: str, session_type: str = "Q") -> dict:
+    """Runs in a worker process: load and store the first season that works"""
+    # Imported here so the parent never pays for fastf1 just to hand out work
+    from .geometry_store import load_geometry
+    from .map_generator import get_track_geometry
+
+    start = time.perf_counter()
+    errors = []
+    for year in years:
+        if load_geometry(year, gp, session_type) is not None:
+            return {"gp": gp, "year": year, "status": "stored", "seconds": round(time.perf_counter() - start, 2)}
+        try:
+            get_track_geometry(year, gp, session_type)
+            return {"gp": gp, "year": year, "status": "generated", "seconds": round(time.perf_counter() - start, 2)}
+        except Exception as e:
+            errors.append(f"{year}: {e}")
+    return {"gp": gp, "year": None, "status": "failed", "seconds": round(time.perf_counter() - start, 2),
+            "error": " / ".join(errors)}
+
+def warm_calendar(calendar, workers: int = WARMUP_WORKERS, session_type: str = "Q"):
+    """Warm every circuit on the calendar across a process pool, printing each as it finishes"""
+    season = int(calendar.get("season"))
+    circuits = {}
+    for race in calendar.get("races", []):
+        gp = circuit_gp(race)
+        if gp:
+            circuits[gp] = map_years(season, race)
+
+    print(f"Warming track maps for {len(circuits)} circuits with {workers} workers")
+    start = time.perf_counter()
+    results = []
+    # spawn rather than fork, the parent may be a running server with threads and an event loop
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(warm_circuit, years, gp, session_type) for gp, years in circuits.items()]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            line = f"  {result['gp']:<32} {result['status']:<9} {result['seconds']:>7.2f}s"
+            if result["year"]:
+                line += f"  ({result['year']})"
+            if result.get("error"):
+                line += f"  {result['error']}"
+            print(line)
+
+    failed = sum(r["status"] == "failed" for r in results)
+    print(f"Track map warm-up done in {time.perf_counter() - start:.1f}s, {failed} failed")
+    return sorted(results, key=lambda r: r["gp"])
+
+async def warm_in_background():
+    """Startup task, runs the warm-up on a thread so the event loop stays free"""
+    from ..season_calendar import get_season_calendar
+
+    calendar = await get_season_calendar()
+    if "error" in calendar:
+        print("Track map warm-up skipped, no calendar:", calendar["error"])
+        return
+    try:
+        await asyncio.to_thread(warm_calendar, calendar)
+    except Exception as e:
+        print(f"Track map warm-up failed: {e}")
+
+async def _fetch_calendar():
+    from ..season_calendar import build_season_calendar
+    from ..http_client import close_client
+
+    try:
+        calendar, expire = await build_season_calendar()
+    finally:
+        await close_client()
+    return calendar
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WARMUP_WORKERS)
+    parser.add_argument("--session", default="Q")
+    parser.add_argument("--json", help="Also write the per-circuit results here")
+    args = parser.parse_args()
+
+    calendar = asyncio.run(_fetch_calendar())
+    if "error" in calendar:
+        raise SystemExit(f"Couldn't fetch the season calendar: {calendar['error']}")
+
+    results = warm_calendar(calendar, args.workers, args.session)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if any(r["status"] == "failed" for r in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
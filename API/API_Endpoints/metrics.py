@@ -0,0 +1,123 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+router = APIRouter()
+
+# Counters and histograms in plain dicts, written out in Prometheus' text format on
+# /metrics. Cheap enough for every request: a lock, a bisect and a few adds.
+
+# Seconds. Cached hits land in the first couple, fastf1 loads in the last
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "f1_http_request_duration_seconds": ("histogram", "Time until response headers went out, per route"),
+    "f1_cache_requests_total": ("counter", "Cache lookups per key: hit, stale (served while refreshing) or miss"),
+    "f1_upstream_request_duration_seconds": ("histogram", "Upstream HTTP calls per host and status, retries counted separately"),
+    "f1_map_stage_duration_seconds": ("histogram", "Time spent in each stage of building a track map"),
+}
+
+_lock = threading.Lock()
+# name -> {labels: value} for counters, {labels: [count per bucket..., +Inf, sum]} for histograms
+_values = {name: {} for name in METRICS}
+
+def _key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def inc(name: str, amount: float = 1, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _values[name]
+        series[key] = series.get(key, 0) + amount
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _values[name].get(key)
+        if series is None:
+            series = _values[name][key] = [0] * (len(BUCKETS) + 2)
+        series[bisect_left(BUCKETS, seconds)] += 1
+        series[-1] += seconds
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe how long the block took, exceptions included"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def render() -> str:
+    with _lock:
+        snapshot = {name: {key: list(v) if isinstance(v, list) else v for key, v in series.items()}
+                    for name, series in _values.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(snapshot[name].items()):
+            if kind == "counter":
+                lines.append(f"{name}{_labels(key)} {value}")
+                continue
+            # Stored per bucket, Prometheus wants them cumulative
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(key)} {value[-1]:.6f}")
+            lines.append(f"{name}_count{_labels(key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def _route_template(scope) -> str:
+    """
+    Route template (/f1/{season}/races) rather than the raw path, so a scan of random
+    URLs can't create a series each. Routes from included routers only know their own
+    part of the path, the prefix is whatever comes before the bit their pattern matches
+    """
+    route = scope.get("route")
+    pattern = getattr(route, "path_regex", None)
+    if pattern is None:
+        return "unmatched"
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and pattern.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing each request to its response headers, per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                observe("f1_http_request_duration_seconds", time.perf_counter() - start,
+                        route=_route_template(scope), method=scope["method"], status=message["status"])
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
+
+@router.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
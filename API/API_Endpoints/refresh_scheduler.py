@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+import asyncio
+import pytz
+
+from .season_calendar import get_season_calendar, build_season_calendar, CALENDAR_CACHE_KEY
+from .current_race_cleaner import build_next_race
+from .races_cleaner import build_all_races
+from .drivers_cleaner import build_drivers_championship
+from .constructors_cleaner import build_constructors_championship
+from .map.router import build_next_track_map
+from .swr_cache import refresh
+from .settings import settings
+
+UTC = pytz.utc
+
+# Caches only refresh reactively otherwise, so the first person to look after a session
+# pays for the upstream fetch (or a full fastf1 load for the map). This wakes up at the
+# interesting points of a race weekend and sleeps the rest of the time.
+SCHEDULER_ENABLED = settings.refresh_scheduler
+
+# Rough session lengths, the calendar only has start times
+SESSION_LENGTH = {
+    "race": timedelta(hours=2),
+    "sprintRace": timedelta(hours=1),
+}
+DEFAULT_SESSION_LENGTH = timedelta(hours=1)
+
+# Standings take a while to show up upstream after the flag, so check twice
+STANDINGS_DELAYS = (timedelta(minutes=30), timedelta(hours=3))
+MAP_DELAY = timedelta(minutes=30)
+
+# Re-read the calendar at least this often in case it moves, and when nothing is scheduled
+MAX_SLEEP = 6 * 3600
+IDLE_SLEEP = 12 * 3600
+ERROR_SLEEP = 3600
+
+_task = None
+
+async def refresh_next_race():
+    await refresh(CALENDAR_CACHE_KEY, build_season_calendar)
+    await asyncio.gather(
+        refresh("f1:next_race", build_next_race),
+        refresh("f1:all_races", build_all_races),
+    )
+
+async def refresh_standings():
+    await asyncio.gather(
+        refresh("drivers_championship", build_drivers_championship),
+        refresh("constructors_championship", build_constructors_championship),
+    )
+
+async def refresh_track_map():
+    await refresh("track_map_svg", build_next_track_map)
+
+JOBS = {
+    "next_race": refresh_next_race,
+    "standings": refresh_standings,
+    "track_map": refresh_track_map,
+}
+
+def build_timetable(calendar):
+    """(when, job) pairs for every session on the calendar"""
+    timetable = []
+    for race in calendar.get("races", []):
+        for session_name, session in (race.get("schedule") or {}).items():
+            start_str = (session or {}).get("datetime_rfc3339")
+            if not start_str:
+                continue
+            start = datetime.fromisoformat(start_str).astimezone(UTC)
+            end = start + SESSION_LENGTH.get(session_name, DEFAULT_SESSION_LENGTH)
+
+            # Countdown moves on to the next session as soon as one starts
+            timetable.append((start, "next_race"))
+
+            if session_name in ("race", "sprintRace"):
+                for delay in STANDINGS_DELAYS:
+                    timetable.append((end + delay, "standings"))
+
+            if session_name == "race":
+                # Next weekend's map as soon as this one is done
+                timetable.append((end + MAP_DELAY, "track_map"))
+
+    return sorted(timetable)
+
+async def run_due_jobs(timetable, now):
+    due = sorted({job for when, job in timetable if when <= now})
+    if not due:
+        return
+
+    # Calendar and next race always go first, the other jobs read from them
+    for job in ["next_race"] + [job for job in due if job != "next_race"]:
+        print(f"Scheduled refresh: {job}")
+        try:
+            await JOBS[job]()
+        except Exception as e:
+            print(f"Scheduled refresh {job} failed: {e}")
+
+async def scheduler_loop():
+    last_run = datetime.now(UTC)
+    while True:
+        calendar = await get_season_calendar()
+        if "error" in calendar:
+            print("Scheduler couldn't read the calendar:", calendar["error"])
+            await asyncio.sleep(ERROR_SLEEP)
+            continue
+
+        timetable = build_timetable(calendar)
+        now = datetime.now(UTC)
+
+        # Anything that came due while we were asleep (or since the last pass)
+        await run_due_jobs([(when, job) for when, job in timetable if last_run < when], now)
+        last_run = now
+
+        upcoming = [when for when, job in timetable if when > now]
+        if upcoming:
+            sleep_for = min((upcoming[0] - now).total_seconds() + 1, MAX_SLEEP)
+        else:
+            # Off season, nothing to do until the calendar changes
+            sleep_for = IDLE_SLEEP
+        await asyncio.sleep(sleep_for)
+
+def start_scheduler():
+    global _task
+    if SCHEDULER_ENABLED and _task is None:
+        _task = asyncio.create_task(scheduler_loop())
+
+async def stop_scheduler():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
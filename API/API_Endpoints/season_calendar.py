@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+import pytz
+
+from .upstream import fetch_json, UpstreamError, SNAPSHOT_EXPIRE
+from .swr_cache import get_entry, get_or_refresh, INTERNAL_KEYS
+from .settings import settings
+
+# Timezone information
+TZ = settings.timezone
+MT = settings.tz
+UTC = pytz.utc
+
+SEASON_API_URL = "https://f1api.dev/api/current"
+CALENDAR_CACHE_KEY = "f1:season_calendar"
+# Only the views below read it, no endpoint sends it as is
+INTERNAL_KEYS.add(CALENDAR_CACHE_KEY)
+
+# Calendar barely changes, races/next_race/next_map are all views over this one copy
+CALENDAR_EXPIRE = 3600
+
+# Convert to timezone function
+def convert_to_mt(date_str, time_str):
+    if not date_str or not time_str:
+        return None
+    dt_utc = datetime.strptime(f"{date_str}T{time_str}", "%Y-%m-%dT%H:%M:%SZ")
+    dt_utc = UTC.localize(dt_utc)
+    return dt_utc.astimezone(MT)
+
+def format_race_schedule(schedule):
+    """Format race schedule times to local timezone"""
+    formatted_schedule = {}
+    for session, val in schedule.items():
+        if val and val.get("date") and val.get("time"):
+            dt_mt = convert_to_mt(val["date"], val["time"])
+            formatted_schedule[session] = {
+                "date": dt_mt.strftime("%Y-%m-%d"),
+                "time": dt_mt.strftime("%I%p").replace('0', ''),
+                "datetime_rfc3339": dt_mt.isoformat()
+            }
+        else:
+            formatted_schedule[session] = val
+    return formatted_schedule
+
+def process_circuit_data(circuit):
+    """Process and clean circuit data"""
+    if not circuit:
+        return circuit
+
+    # Process circuit length
+    if "circuitLength" in circuit:
+        try:
+            raw_length = int(circuit["circuitLength"].replace("km", "").strip())
+            circuit["circuitLengthKm"] = raw_length / 1000.0
+        except Exception:
+            circuit["circuitLengthKm"] = None
+
+    # Format fastest driver name
+    fastest_driver_id = circuit.get("fastestLapDriverId")
+    if fastest_driver_id:
+        name_parts = fastest_driver_id.replace("_", " ").split(" ")
+        circuit["fastestLapDriverName"] = name_parts[-1].capitalize()
+
+    # Format lap record time
+    fastest_lap_time = circuit.get("lapRecord")
+    if fastest_lap_time:
+        circuit["lapRecord"] = ".".join(fastest_lap_time.rsplit(":", 1))
+
+    return circuit
+
+def process_race_data(race):
+    """Process individual race data"""
+    processed_race = race.copy()
+
+    # Format schedule
+    if "schedule" in processed_race:
+        processed_race["schedule"] = format_race_schedule(processed_race["schedule"])
+
+    # Process circuit data
+    if "circuit" in processed_race:
+        processed_race["circuit"] = process_circuit_data(processed_race["circuit"])
+
+    # Calculate total distance
+    laps = processed_race.get("laps")
+    circuit_length = processed_race.get("circuit", {}).get("circuitLengthKm")
+    if laps and circuit_length is not None:
+        processed_race["totalDistanceKm"] = round(laps * circuit_length, 2)
+    else:
+        processed_race["totalDistanceKm"] = None
+
+    # Determine race status
+    now = datetime.utcnow()
+    race_date_str = processed_race.get("schedule", {}).get("race", {}).get("date")
+    race_time_str = processed_race.get("schedule", {}).get("race", {}).get("time")
+
+    if race_date_str and race_time_str:
+        try:
+            # Parse the formatted time back to check status
+            race_dt_local = datetime.fromisoformat(processed_race["schedule"]["race"]["datetime_rfc3339"])
+            race_dt_utc = race_dt_local.astimezone(UTC).replace(tzinfo=None)
+
+            if race_dt_utc < now:
+                processed_race["status"] = "completed"
+            elif race_dt_utc.date() == now.date():
+                processed_race["status"] = "today"
+            else:
+                processed_race["status"] = "upcoming"
+        except Exception:
+            processed_race["status"] = "unknown"
+    else:
+        processed_race["status"] = "unknown"
+
+    return processed_race
+
+def race_start(race):
+    """Race start as an aware datetime, None if the calendar doesn't have it yet"""
+    race_dt_str = race.get("schedule", {}).get("race", {}).get("datetime_rfc3339")
+    if not race_dt_str:
+        return None
+    try:
+        return datetime.fromisoformat(race_dt_str)
+    except Exception:
+        return None
+
+async def get_season_calendar():
+    """Fetch and process the season calendar once, every endpoint reads from this"""
+    return await get_or_refresh(CALENDAR_CACHE_KEY, build_season_calendar)
+
+async def get_season_calendar_entry():
+    """Calendar with its cache validators, for views that answer conditional requests"""
+    return await get_entry(CALENDAR_CACHE_KEY, build_season_calendar)
+
+async def build_season_calendar():
+    try:
+        races_data, live = await fetch_json("season_calendar", SEASON_API_URL)
+    except UpstreamError as e:
+        return {"error": f"Failed to fetch races data: {e}"}, None
+
+    # Process every race once per refresh, sorted by round number
+    processed_races = [process_race_data(race) for race in races_data.get("races", [])]
+    processed_races = sorted(processed_races, key=lambda r: r.get("round", 0))
+
+    expire = CALENDAR_EXPIRE if live else SNAPSHOT_EXPIRE
+    expiry_dt = datetime.now(MT) + timedelta(seconds=expire)
+
+    calendar = {
+        "season": races_data.get("season"),
+        "championship": races_data.get("championship"),
+        "cache_expires": expiry_dt.isoformat(),
+        "races": processed_races
+    }
+
+    return calendar, expire
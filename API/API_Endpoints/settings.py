@@ -0,0 +1,89 @@
+import os
+import pytz
+
+EVENT_DETAILS = ("main", "race", "detailed")
+CACHE_BACKENDS = ("memory", "sqlite", "redis")
+
+_TRUE = ("on", "true", "1", "yes")
+_FALSE = ("off", "false", "0", "no")
+
+def _text(environ, name: str, default: str = "") -> str:
+    return (environ.get(name) or default).strip()
+
+def _number(environ, name: str, default, cast, minimum):
+    raw = _text(environ, name)
+    if not raw:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        kind = "a whole number" if cast is int else "a number"
+        raise ValueError(f"{name} must be {kind}, got '{raw}'")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got '{raw}'")
+    return value
+
+def _int(environ, name: str, default: int, minimum: int = 0) -> int:
+    return _number(environ, name, default, int, minimum)
+
+def _float(environ, name: str, default: float, minimum: float = 0) -> float:
+    return _number(environ, name, default, float, minimum)
+
+def _flag(environ, name: str, default: bool) -> bool:
+    raw = _text(environ, name).lower()
+    if not raw:
+        return default
+    if raw in _TRUE:
+        return True
+    if raw in _FALSE:
+        return False
+    raise ValueError(f"{name} must be on or off, got '{raw}'")
+
+class Settings:
+    """Config every module shares, read from the environment and checked once at startup"""
+
+    def __init__(self, environ=os.environ):
+        self.timezone = _text(environ, "TIMEZONE")
+        if self.timezone not in pytz.all_timezones_set:
+            raise ValueError('Invalid time zone selection')
+        self.tz = pytz.timezone(self.timezone)
+
+        self.track_colour = _text(environ, "TRACK_COLOUR")
+
+        self.event_detail = _text(environ, "EVENT_DETAIL", "main")
+        if self.event_detail not in EVENT_DETAILS:
+            raise ValueError("Select one of: 'main', 'race', or 'detailed'. No selection defaults to main.")
+
+        # Response cache
+        self.cache_backend = _text(environ, "CACHE_BACKEND", "memory").lower()
+        if self.cache_backend not in CACHE_BACKENDS:
+            raise ValueError("Select one of: 'memory', 'sqlite' or 'redis' for CACHE_BACKEND.")
+        self.cache_sqlite_path = _text(environ, "CACHE_SQLITE_PATH", "data/cache.sqlite3")
+        self.redis_url = _text(environ, "REDIS_URL", "redis://localhost:6379/0")
+        self.cache_stale_seconds = _int(environ, "CACHE_STALE_SECONDS", 7 * 24 * 3600)
+        self.refresh_scheduler = _flag(environ, "REFRESH_SCHEDULER", True)
+
+        # f1api.dev calls
+        self.upstream_timeout = _float(environ, "UPSTREAM_TIMEOUT", 5.0, minimum=0.1)
+        self.upstream_retries = _int(environ, "UPSTREAM_RETRIES", 2)
+        self.upstream_retry_budget = _float(environ, "UPSTREAM_RETRY_BUDGET", 8.0, minimum=0.1)
+        self.upstream_cooldown = _int(environ, "UPSTREAM_COOLDOWN", 60)
+        self.snapshot_dir = _text(environ, "SNAPSHOT_DIR", "data/snapshots")
+        self.history_db_path = _text(environ, "HISTORY_DB_PATH", "data/history.sqlite3")
+
+        # Track maps and fastf1
+        self.map_workers = _int(environ, "MAP_WORKERS", 2, minimum=1)
+        self.map_max_variants = _int(environ, "MAP_MAX_VARIANTS", 32)
+        self.map_simplify_tolerance = _float(environ, "MAP_SIMPLIFY_TOLERANCE", 0.5)
+        self.map_warmup = _flag(environ, "MAP_WARMUP", False)
+        self.map_warmup_workers = _int(environ, "MAP_WARMUP_WORKERS", 4, minimum=1)
+        self.track_store_dir = _text(environ, "TRACK_STORE_DIR", "data/track_store")
+        self.fastf1_cache_dir = _text(environ, "FASTF1_CACHE_DIR", "data/fastf1")
+        self.fastf1_cache_max_mb = _int(environ, "FASTF1_CACHE_MAX_MB", 2048)
+
+        # /f1/live
+        self.live_dir = _text(environ, "LIVE_DIR", "data/live")
+        self.live_replay_file = _text(environ, "LIVE_REPLAY_FILE")
+        self.live_replay_speed = _float(environ, "LIVE_REPLAY_SPEED", 1.0, minimum=0.01)
+
+settings = Settings()
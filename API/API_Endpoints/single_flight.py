@@ -0,0 +1,33 @@
+from collections import defaultdict
+import asyncio
+
+# One upstream fetch per key at a time. When ten dashboards refresh together right
+# after a key expires, the first caller does the work and the other nine await it.
+_inflight = {}
+
+# Per key: how many calls actually went to the origin vs. piggybacked on one in flight
+_stats = defaultdict(lambda: {"origin": 0, "coalesced": 0})
+
+async def do(key: str, fn, stats_key: str = None):
+    """
+    Run fn() for key unless it's already running, in which case share that result.
+    stats_key counts it under a shared name, for keys a client can make up (map variants)
+    """
+    stats_key = stats_key or key
+    task = _inflight.get(key)
+    if task is None:
+        _stats[stats_key]["origin"] += 1
+        task = asyncio.ensure_future(fn())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.pop(key, None) if _inflight.get(key) is done else None)
+    else:
+        _stats[stats_key]["coalesced"] += 1
+
+    # Shield so one caller going away (client disconnect) doesn't cancel it for the rest
+    return await asyncio.shield(task)
+
+def get_stats():
+    return {
+        key: dict(counts, in_flight=key in _inflight)
+        for key, counts in sorted(_stats.items())
+    }
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from . import single_flight
+from .flags import get_misses
+
+router = APIRouter()
+
+@router.get("/", summary="Upstream request coalescing counters and flag lookup misses")
+async def get_stats():
+    # origin = calls that actually hit upstream / did the work, coalesced = calls that
+    # waited on one already in flight. flag_misses = names we had no flag code for
+    return {"single_flight": single_flight.get_stats(), "flag_misses": get_misses()}
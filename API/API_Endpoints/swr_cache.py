@@ -0,0 +1,188 @@
+from fastapi_cache import FastAPICache
+import asyncio
+import gzip
+import hashlib
+import orjson
+import struct
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import single_flight
+from .metrics import inc
+from .settings import settings
+
+# How long past its expiry a value is still kept around to serve while refreshing,
+# or when upstream is down. Old standings beat an error on the dashboard.
+STALE_SECONDS = settings.cache_stale_seconds
+
+# Background refreshes currently running, one per key
+_refreshing = {}
+
+# Keys only ever read by other views, never sent to a client. They're stored as plain JSON
+# without the gzip/br copies nobody would ask for
+INTERNAL_KEYS = set()
+
+# Brotli's top qualities cost ~40x the time of q5 for ~15% smaller bodies, and this runs
+# on every refresh. gzip 6 is the usual speed/size point too
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def is_error(value) -> bool:
+    return isinstance(value, dict) and "error" in value
+
+def make_etag(payload: bytes) -> str:
+    return '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+def encode_bodies(value, compress: bool = True):
+    """
+    Response body in every encoding we serve, done once per refresh instead of per request.
+    Compressing a big body takes a few ms, so callers on the event loop run this in a thread
+    """
+    if isinstance(value, bytes):
+        # Images are compressed already, gzip/br would only cost time
+        return "binary", {"identity": value}
+    if isinstance(value, str):
+        kind, body = "text", value.encode("utf-8")
+    else:
+        kind, body = "json", orjson.dumps(value)
+
+    return kind, compress_body(body) if compress else {"identity": body}
+
+def compress_body(body: bytes):
+    """identity/gzip/br copies of an already encoded body. Blocking, a few ms for a big one"""
+    bodies = {"identity": body}
+    compressed = {"gzip": gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    for encoding, data in compressed.items():
+        # Tiny bodies can come out bigger, no point serving those
+        if len(data) < len(body):
+            bodies[encoding] = data
+    return bodies
+
+def entry_value(entry):
+    """Decoded value of an entry, only done for internal callers that need the data itself"""
+    if "value" not in entry:
+        body = entry["bodies"]["identity"]
+        if entry["kind"] == "binary":
+            entry["value"] = body
+        else:
+            entry["value"] = body.decode("utf-8") if entry["kind"] == "text" else orjson.loads(body)
+    return entry["value"]
+
+def _pack(entry) -> bytes:
+    # Length-prefixed JSON header followed by the raw bodies back to back. Shared
+    # backends only hold bytes, and this way a hit never re-encodes anything
+    encodings = [(name, len(body)) for name, body in entry["bodies"].items()]
+    meta = orjson.dumps({key: entry[key] for key in ("fresh_until", "etag", "last_modified", "kind")}
+                        | {"encodings": encodings})
+    return struct.pack(">I", len(meta)) + meta + b"".join(entry["bodies"].values())
+
+def _unpack(raw: bytes):
+    try:
+        (meta_len,) = struct.unpack_from(">I", raw)
+        entry = orjson.loads(raw[4:4 + meta_len])
+        offset = 4 + meta_len
+        entry["bodies"] = {}
+        for name, length in entry.pop("encodings"):
+            entry["bodies"][name] = raw[offset:offset + length]
+            offset += length
+        return entry
+    except Exception:
+        # Written by an older version, treat as a miss and rebuild
+        return None
+
+async def _read(cache_key: str):
+    raw = await FastAPICache.get_backend().get(cache_key)
+    return _unpack(raw) if raw else None
+
+async def _store(cache_key: str, value, expire: int):
+    # Bodies and ETag are worked out once here, not on every request, and off the loop
+    kind, bodies = await asyncio.to_thread(encode_bodies, value, cache_key not in INTERNAL_KEYS)
+    etag = make_etag(bodies["identity"])
+    now = time.time()
+
+    # Same content as before keeps its Last-Modified, so clients' If-Modified-Since still matches
+    previous = await _read(cache_key)
+    last_modified = previous["last_modified"] if previous and previous.get("etag") == etag else now
+
+    entry = {"value": value, "kind": kind, "bodies": bodies, "fresh_until": now + expire,
+             "etag": etag, "last_modified": last_modified}
+    await FastAPICache.get_backend().set(cache_key, _pack(entry), expire=max(expire, 0) + STALE_SECONDS)
+    return entry
+
+async def _build_and_store(cache_key: str, build):
+    """Run build() and store a good result. Returns the entry either way"""
+    value, expire = await build()
+    if expire is not None and not is_error(value):
+        return await _store(cache_key, value, expire)
+    # Not cacheable, so no validators either
+    return {"value": value}
+
+def _metric_key(cache_key: str) -> str:
+    # Map variants (any size, colour...) are counted together
+    return "track_map_variant" if cache_key.startswith("track_map:") else cache_key
+
+async def _fetch(cache_key: str, build):
+    # Cold misses and background refreshes for the same key share one upstream fetch
+    return await single_flight.do(cache_key, lambda: _build_and_store(cache_key, build), _metric_key(cache_key))
+
+async def _refresh(cache_key: str, build):
+    try:
+        value = (await _fetch(cache_key, build))["value"]
+        if is_error(value):
+            print(f"Refresh failed for {cache_key}, keeping last good value: {value['error']}")
+    except Exception as e:
+        print(f"Refresh failed for {cache_key}, keeping last good value: {e}")
+    finally:
+        _refreshing.pop(cache_key, None)
+
+def refresh_in_background(cache_key: str, build):
+    if cache_key not in _refreshing:
+        _refreshing[cache_key] = asyncio.create_task(_refresh(cache_key, build))
+    return _refreshing[cache_key]
+
+async def refresh(cache_key: str, build):
+    """Rebuild a key now (e.g. from the scheduler), joining a refresh that's already running"""
+    await asyncio.shield(refresh_in_background(cache_key, build))
+
+async def get_entry(cache_key: str, build):
+    """
+    Stale-while-revalidate over the fastapi-cache backend.
+
+    build is an async callable returning (value, expire). An expire of None means
+    don't cache it, and a value with an "error" key counts as a failed fetch.
+    Expired values are returned straight away while one background task refreshes them.
+
+    Returns the stored entry: pre-encoded bodies plus fresh_until, etag and last_modified
+    when cached, or just the value when it couldn't be cached. Use entry_value for the data.
+    """
+    entry = await _read(cache_key)
+
+    if entry:
+        if time.time() >= entry["fresh_until"]:
+            inc("f1_cache_requests_total", key=_metric_key(cache_key), result="stale")
+            refresh_in_background(cache_key, build)
+        else:
+            inc("f1_cache_requests_total", key=_metric_key(cache_key), result="hit")
+        return entry
+
+    # Nothing cached at all, have to wait for it
+    inc("f1_cache_requests_total", key=_metric_key(cache_key), result="miss")
+    return await _fetch(cache_key, build)
+
+async def forget(cache_key: str):
+    """Drop a key from the cache, e.g. a map variant nobody has asked for in a while"""
+    try:
+        await FastAPICache.get_backend().clear(key=cache_key)
+    except Exception:
+        # Already gone (the memory backend raises for that)
+        pass
+
+async def get_or_refresh(cache_key: str, build):
+    """Just the value from get_entry, for code that isn't building a response"""
+    return entry_value(await get_entry(cache_key, build))
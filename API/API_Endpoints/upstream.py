@@ -0,0 +1,150 @@
+from urllib.parse import urlsplit
+import asyncio
+import orjson
+import os
+import random
+import time
+
+from .files import write_atomic
+from .http_client import get_client
+from .metrics import observe
+from .settings import settings
+
+# Every f1api.dev call goes through here: bounded time per attempt, a couple of jittered
+# retries, a circuit breaker per host, and a last-known-good copy of each resource on
+# disk so the widgets still have something to show when upstream is down.
+UPSTREAM_TIMEOUT = settings.upstream_timeout
+UPSTREAM_RETRIES = settings.upstream_retries
+RETRY_BASE_DELAY = 0.5
+# Upper bound on a whole call, retries and backoff included, so a cold start with upstream
+# down fails in seconds rather than 3 x the timeout
+UPSTREAM_RETRY_BUDGET = settings.upstream_retry_budget
+
+# Consecutive failed calls (after retries) before we stop calling a host for a while
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = settings.upstream_cooldown
+
+SNAPSHOT_DIR = settings.snapshot_dir
+
+# Data served from a snapshot only gets cached briefly so we go back upstream soon
+SNAPSHOT_EXPIRE = 300
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# host -> {"failures": int, "open_until": float}
+_breakers = {}
+
+class UpstreamError(Exception):
+    pass
+
+class UpstreamNotFound(UpstreamError):
+    """Upstream answered fine, it just doesn't have this (a 4xx). Not a sign the host is down"""
+    pass
+
+def _breaker(host: str) -> dict:
+    return _breakers.setdefault(host, {"failures": 0, "open_until": 0.0})
+
+def breaker_open(host: str) -> bool:
+    return time.time() < _breaker(host)["open_until"]
+
+def _record_success(host: str):
+    breaker = _breaker(host)
+    if breaker["failures"] >= BREAKER_THRESHOLD:
+        print(f"Circuit to {host} closed again")
+    breaker["failures"] = 0
+    breaker["open_until"] = 0.0
+
+def _record_failure(host: str):
+    breaker = _breaker(host)
+    breaker["failures"] += 1
+    # Once tripped, every failed trial call after the cool-down opens it straight back up
+    if breaker["failures"] >= BREAKER_THRESHOLD:
+        breaker["open_until"] = time.time() + BREAKER_COOLDOWN
+        print(f"Circuit to {host} open for {BREAKER_COOLDOWN}s after {breaker['failures']} failures")
+
+def _snapshot_path(resource: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{resource}.json")
+
+def _write_snapshot(resource: str, payload: bytes):
+    write_atomic(_snapshot_path(resource), lambda f: f.write(payload), suffix=".json.tmp")
+
+def _read_snapshot(resource: str):
+    try:
+        with open(_snapshot_path(resource), 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+def _snapshot_exists(resource: str) -> bool:
+    return os.path.exists(_snapshot_path(resource))
+
+async def _get_with_retries(url: str, retries: int = None) -> bytes:
+    client = get_client()
+    host = urlsplit(url).netloc
+    retries = UPSTREAM_RETRIES if retries is None else retries
+    deadline = time.monotonic() + UPSTREAM_RETRY_BUDGET
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            # Exponential backoff with full jitter so workers don't retry in lockstep
+            await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        start = time.perf_counter()
+        try:
+            response = await client.get(url, timeout=min(UPSTREAM_TIMEOUT, remaining))
+        except Exception as e:
+            observe("f1_upstream_request_duration_seconds", time.perf_counter() - start,
+                    host=host, status=type(e).__name__)
+            last_error = f"{type(e).__name__}: {e}"
+            continue
+        observe("f1_upstream_request_duration_seconds", time.perf_counter() - start,
+                host=host, status=response.status_code)
+        if response.status_code == 200:
+            return response.content
+        last_error = f"status {response.status_code}"
+        if response.status_code not in RETRY_STATUSES:
+            if 400 <= response.status_code < 500:
+                raise UpstreamNotFound(last_error)
+            break
+    raise UpstreamError(last_error)
+
+async def fetch_json(resource: str, url: str, snapshot: bool = True):
+    """
+    GET url as JSON. Returns (data, live) where live is False when upstream couldn't be
+    reached and the last good copy from disk was used instead. Raises UpstreamError when
+    there's neither. snapshot=False skips the on-disk copy for data kept elsewhere.
+    A 4xx raises UpstreamNotFound straight away: the host is fine, so the breaker isn't
+    touched, and there's no snapshot of something that doesn't exist.
+    When there is a snapshot to fall back on it's served after the first failed attempt,
+    retrying is left to the cache's next refresh (snapshot data is only kept SNAPSHOT_EXPIRE).
+    """
+    host = urlsplit(url).netloc
+
+    if breaker_open(host):
+        error = f"circuit open for {host}"
+    else:
+        try:
+            retries = 0 if snapshot and await asyncio.to_thread(_snapshot_exists, resource) else None
+            payload = await _get_with_retries(url, retries)
+            data = orjson.loads(payload)
+            _record_success(host)
+            if not snapshot:
+                return data, True
+            try:
+                await asyncio.to_thread(_write_snapshot, resource, payload)
+            except Exception as e:
+                print(f"Failed to write snapshot for {resource}: {e}")
+            return data, True
+        except UpstreamNotFound:
+            raise
+        except (UpstreamError, orjson.JSONDecodeError) as e:
+            _record_failure(host)
+            error = str(e)
+
+    last_good = await asyncio.to_thread(_read_snapshot, resource) if snapshot else None
+    if last_good is None:
+        raise UpstreamError(error)
+    print(f"Upstream unavailable for {resource} ({error}), serving last known good snapshot")
+    return last_good, False
@@ -0,0 +1,94 @@
+"""
+Time from launching uvicorn to the first healthy response, the way the Docker
+HEALTHCHECK sees it. Each run is a fresh server process.
+
+    python -m benchmarks.cold_start [--runs 5] [--path /f1/next_race/]
+
+The first request goes to the real upstream APIs, so run it with network access.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _env():
+    return dict(os.environ, TIMEZONE=os.environ.get("TIMEZONE", "UTC"),
+                TRACK_COLOUR=os.environ.get("TRACK_COLOUR", "#e10600"))
+
+def import_seconds() -> float:
+    """Just `import main`, in a fresh interpreter"""
+    out = subprocess.run(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"],
+        cwd=API_DIR, env=_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def run_once(path: str, timeout: float) -> dict:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=API_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"listening": None, "healthy": None, "status": None}
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    response = client.get(f"http://127.0.0.1:{port}{path}")
+                except httpx.TransportError:
+                    time.sleep(0.02)
+                    continue
+                # The request that first got through includes the cold upstream fetch
+                if result["listening"] is None:
+                    result["listening"] = round(time.perf_counter() - start, 3)
+                result["status"] = response.status_code
+                if response.status_code == 200:
+                    result["healthy"] = round(time.perf_counter() - start, 3)
+                    break
+                time.sleep(0.1)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/f1/next_race/")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="Also write the results here")
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    runs = [run_once(args.path, args.timeout) for _ in range(args.runs)]
+
+    listening = [r["listening"] for r in runs if r["listening"] is not None]
+    healthy = [r["healthy"] for r in runs if r["healthy"] is not None]
+    results = {
+        "path": args.path,
+        "import_main_seconds": round(statistics.median(imports), 3),
+        "first_response_seconds": round(statistics.median(listening), 3) if listening else None,
+        "healthy_seconds": round(statistics.median(healthy), 3) if healthy else None,
+        "runs": runs,
+    }
+    print(f"import main:     {results['import_main_seconds']}s")
+    print(f"first response:  {results['first_response_seconds']}s")
+    print(f"healthy {args.path}: {results['healthy_seconds']}s ({len(healthy)}/{len(runs)} runs)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the targeted fastest-lap loader against the old full-session load.
+
+Each run happens in a fresh subprocess with an empty fastf1 cache so wall time,
+peak RSS and downloaded bytes are all cold numbers.
+
+    python -m benchmarks.map_loader --year 2024 --gp "Monza Italy" --session Q
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_once(year: int, gp: str, session_type: str, full_load: bool) -> dict:
+    import resource
+    import time
+    import fastf1
+    import requests.adapters
+
+    from API_Endpoints import fastf1_cache
+
+    fastf1_cache.enable(tempfile.mkdtemp(prefix="f1bench_"))
+    from API_Endpoints.map.map_generator import load_track_geometry
+
+    # Count every byte that actually comes over the wire
+    downloaded = {"bytes": 0, "requests": 0}
+    original_send = requests.adapters.HTTPAdapter.send
+
+    def counting_send(self, *args, **kwargs):
+        resp = original_send(self, *args, **kwargs)
+        downloaded["bytes"] += len(resp.content)
+        downloaded["requests"] += 1
+        return resp
+
+    requests.adapters.HTTPAdapter.send = counting_send
+
+    start = time.perf_counter()
+    points, features = load_track_geometry(year, gp, session_type, full_load=full_load)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "full" if full_load else "targeted",
+        "seconds": round(elapsed, 3),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "downloaded_mb": round(downloaded["bytes"] / 1024 / 1024, 2),
+        "requests": downloaded["requests"],
+        "points": len(points),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--gp", default="Monza Italy")
+    parser.add_argument("--session", default="Q")
+    parser.add_argument("--child", choices=["targeted", "full"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_once(args.year, args.gp, args.session, args.child == "full")
+        print(json.dumps(result))
+        return
+
+    env = dict(os.environ, TIMEZONE=os.environ.get("TIMEZONE", "UTC"),
+               TRACK_COLOUR=os.environ.get("TRACK_COLOUR", "#e10600"))
+    results = []
+    for mode in ("targeted", "full"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.map_loader", "--year", str(args.year),
+             "--gp", args.gp, "--session", args.session, "--child", mode],
+            cwd=API_DIR, env=env, capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    for r in results:
+        print(f"{r['mode']:>8}: {r['seconds']:>7}s  peak {r['peak_rss_mb']:>7} MB  "
+              f"downloaded {r['downloaded_mb']:>7} MB in {r['requests']} requests  ({r['points']} points)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Upstream responses for the offline benchmarks.
+
+f1api.dev JSON lives in fixtures/upstream.json, which is committed so a fresh checkout
+can run the suite straight away. The committed copy is synthetic (hand-made responses
+shaped like f1api.dev's, see its "note"), with a synthetic track shape in
+fixtures/track_geometry.json standing in for a fastf1 session so the map endpoint and
+map stages still run. `record` swaps in real responses, and the fastf1 session the map
+needs goes to fastf1's own cache in fixtures/fastf1, read back in offline mode. That one
+is too big to commit.
+"""
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import os
+
+import httpx
+import orjson
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def upstream_path(fixtures_dir: str) -> str:
+    return os.path.join(fixtures_dir, "upstream.json")
+
+def fastf1_cache_dir(fixtures_dir: str) -> str:
+    return os.path.join(fixtures_dir, "fastf1")
+
+def prepare_environment(workdir: str):
+    """Env for importing the app: no scheduler, and everything it writes goes to workdir"""
+    os.environ.setdefault("TIMEZONE", "UTC")
+    os.environ.setdefault("TRACK_COLOUR", "#e10600")
+    os.environ["REFRESH_SCHEDULER"] = "off"
+    os.environ["MAP_WARMUP"] = "off"
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ["SNAPSHOT_DIR"] = os.path.join(workdir, "snapshots")
+    os.environ["TRACK_STORE_DIR"] = os.path.join(workdir, "track_store")
+    os.environ["HISTORY_DB_PATH"] = os.path.join(workdir, "history.sqlite3")
+    os.environ["LIVE_DIR"] = os.path.join(workdir, "live")
+
+def enable_fastf1_cache(fixtures_dir: str, offline: bool):
+    import fastf1
+    from API_Endpoints import fastf1_cache
+
+    # Before the app gets to set up its own cache dir, which then leaves this one in place
+    fastf1_cache.enable(fastf1_cache_dir(fixtures_dir))
+    # Offline, anything that wasn't recorded fails instead of quietly downloading
+    fastf1.Cache.offline_mode(offline)
+    fastf1.set_log_level("WARNING")
+
+def load_fixtures(fixtures_dir: str):
+    path = upstream_path(fixtures_dir)
+    if not os.path.exists(path):
+        raise SystemExit(f"No fixtures in {fixtures_dir}, record them first with: python -m benchmarks.suite record")
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+def save_fixtures(fixtures_dir: str, responses, map_source=None):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    fixtures = {
+        "synthetic": False,
+        # Calendar dates are shifted on replay so this day lines up with today
+        "dates_as_of": datetime.now(timezone.utc).date().isoformat(),
+        "map": map_source,
+        "responses": dict(sorted(responses.items())),
+    }
+    with open(upstream_path(fixtures_dir), "wb") as f:
+        f.write(orjson.dumps(fixtures, option=orjson.OPT_INDENT_2) + b"\n")
+    return fixtures
+
+def shift_dates(payload, days: int):
+    """Move every session of a calendar by whole days, times of day stay as they are"""
+    for race in payload.get("races") or []:
+        for session in (race.get("schedule") or {}).values():
+            if session and session.get("date"):
+                session["date"] = (date.fromisoformat(session["date"]) + timedelta(days=days)).isoformat()
+    return payload
+
+def replay_responses(fixtures):
+    """
+    Fixture responses keyed by URL, with the current season's calendar moved so today
+    sits where dates_as_of did. Next race, countdowns and cache expiry then come out the
+    same however old the fixtures are.
+    """
+    as_of = date.fromisoformat(fixtures["dates_as_of"])
+    days = (datetime.now(timezone.utc).date() - as_of).days
+    responses = {}
+    for url, payload in fixtures["responses"].items():
+        if "/api/current" in url:
+            payload = shift_dates(payload, days)
+        responses[url] = payload
+    return responses
+
+def seed_track_store(fixtures_dir: str, map_source):
+    """
+    Store the synthetic track shape where the map looks first, so it renders without
+    fastf1. No-op for a recorded fastf1 session, which is loaded the normal way
+    """
+    if not map_source or not map_source.get("geometry"):
+        return
+    from API_Endpoints.map.geometry_store import save_geometry
+
+    with open(os.path.join(fixtures_dir, map_source["geometry"]), "rb") as f:
+        geometry = orjson.loads(f.read())
+    save_geometry(map_source["year"], map_source["gp"], map_source["session"],
+                  geometry["points"], geometry["features"])
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answers upstream calls from the fixture JSON, optionally after a fake network delay"""
+
+    def __init__(self, responses, latency: float = 0.0):
+        # Encoded once so replaying costs next to nothing next to what's measured
+        self.bodies = {url: orjson.dumps(payload) for url, payload in responses.items()}
+        self.latency = latency
+        self.calls = 0
+        self.missing = set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        url = str(request.url)
+        body = self.bodies.get(url)
+        if body is None:
+            if url not in self.missing:
+                self.missing.add(url)
+                print(f"No fixture response for {url}")
+            return httpx.Response(404, json={"error": "Not in the fixtures"}, request=request)
+        return httpx.Response(200, content=body, headers={"Content-Type": "application/json"}, request=request)
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes calls through to the network and keeps every good JSON response"""
+
+    def __init__(self):
+        self.inner = httpx.AsyncHTTPTransport()
+        self.responses = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        # Decoded here, so the copy handed back mustn't claim to be compressed any more
+        response = httpx.Response(response.status_code, headers=response.headers,
+                                  stream=response.stream, request=request)
+        body = await response.aread()
+        if response.status_code == 200:
+            self.responses[str(request.url)] = orjson.loads(body)
+        headers = {"Content-Type": response.headers.get("content-type", "application/json")}
+        return httpx.Response(response.status_code, content=body, headers=headers, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
@@ -0,0 +1,496 @@
+"""
+Offline benchmarks for the API, replaying f1api.dev responses and a track layout from
+fixtures so runs are repeatable and never touch the network.
+
+The committed fixtures are synthetic and run as is. To benchmark against real
+responses and a real fastf1 session, record them once (needs network):
+
+    python -m benchmarks.suite record
+    python -m benchmarks.suite run [--concurrency 20] [--upstream-latency 80]
+    python -m benchmarks.suite run --baseline benchmarks/results/<earlier run>.json
+
+Measures every endpoint cold (empty caches), warm and expired (served stale while
+refreshing), throughput under concurrent load, each cleaner's processing and each
+stage of map generation (time and peak traced memory). Results go to a JSON file,
+and --baseline flags anything that got slower than --threshold times the old run.
+"""
+from contextlib import asynccontextmanager, contextmanager, redirect_stdout
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import orjson
+
+from .replay import (FIXTURES_DIR, prepare_environment, enable_fastf1_cache, load_fixtures, save_fixtures,
+                     replay_responses, seed_track_store, ReplayTransport, RecordingTransport)
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, "benchmarks", "results")
+
+SEASON_URL = "https://f1api.dev/api/current"
+DRIVERS_URL = "https://f1api.dev/api/current/drivers-championship"
+CONSTRUCTORS_URL = "https://f1api.dev/api/current/constructors-championship"
+
+def endpoint_paths(season: int, with_map: bool = True):
+    # The map needs a fastf1 session or the synthetic layout, without either the map
+    # endpoint (and the dashboard's map section) would only measure errors
+    return [
+        "/f1/next_race/",
+        "/f1/races/",
+        "/f1/drivers_standings/",
+        "/f1/constructors_standings/",
+    ] + (["/f1/dashboard/", "/f1/next_map/"] if with_map else
+         ["/f1/dashboard/?sections=next_race,races,drivers_standings,constructors_standings"]) + [
+        f"/f1/{season - 1}/races",
+        f"/f1/{season - 1}/drivers_standings",
+    ]
+
+def summarize(samples):
+    """Latency stats in ms from a list of durations in seconds"""
+    ordered = sorted(samples)
+
+    def percentile(q):
+        # Nearest rank, fine for the sample sizes used here
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)] * 1000
+
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(0.5), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+@contextmanager
+def quiet(verbose: bool):
+    # The app prints on most cache misses, which would bury the results
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        yield
+
+def _tracking_backend():
+    from fastapi_cache.backends.inmemory import InMemoryBackend
+
+    class TrackingBackend(InMemoryBackend):
+        """In-memory backend with its own store (the stock one shares a class level dict)"""
+
+        def __init__(self):
+            self._store = {}
+
+    return TrackingBackend()
+
+def reset_caches(workdir: str):
+    """Back to a cold start: empty response cache, history store and stored track layouts"""
+    from fastapi_cache import FastAPICache
+    from API_Endpoints import history
+
+    backend = _tracking_backend()
+    # init() is a no-op once the app has set the cache up
+    FastAPICache.reset()
+    FastAPICache.init(backend)
+    conn = history._connect()
+    conn.execute("DELETE FROM seasons")
+    conn.execute("DELETE FROM upstream")
+    conn.commit()
+    shutil.rmtree(os.path.join(workdir, "track_store"), ignore_errors=True)
+    return backend
+
+async def expire_all(backend):
+    """Mark every cached entry as past its freshness, as if its expiry had just gone by"""
+    from API_Endpoints import swr_cache
+
+    for key in list(backend._store):
+        entry = await swr_cache._read(key)
+        if entry:
+            entry["fresh_until"] = 0
+            await backend.set(key, swr_cache._pack(entry), expire=swr_cache.STALE_SECONDS)
+
+async def settle():
+    """Wait for background refreshes to finish, returns how long that took"""
+    from API_Endpoints import swr_cache
+
+    start = time.perf_counter()
+    while swr_cache._refreshing:
+        await asyncio.gather(*list(swr_cache._refreshing.values()), return_exceptions=True)
+    return time.perf_counter() - start
+
+async def timed_get(client, path: str):
+    start = time.perf_counter()
+    # Raw bytes, so decompressing on our side isn't counted against the server
+    async with client.stream("GET", path, headers={"Accept-Encoding": "br, gzip"}) as response:
+        async for _ in response.aiter_raw():
+            pass
+    return time.perf_counter() - start, response.status_code
+
+def _scenario(samples, statuses, **extra):
+    result = summarize(samples)
+    failed = sum(status >= 400 for status in statuses)
+    if failed:
+        result["errors"] = failed
+    result.update(extra)
+    return result
+
+async def bench_endpoint(client, path: str, transport, reset, args):
+    result = {}
+
+    samples, statuses = [], []
+    for _ in range(args.cold_runs):
+        await settle()
+        reset()
+        calls = transport.calls
+        elapsed, status = await timed_get(client, path)
+        samples.append(elapsed)
+        statuses.append(status)
+    result["cold"] = _scenario(samples, statuses, upstream_calls=transport.calls - calls)
+
+    samples, statuses = [], []
+    await settle()
+    await timed_get(client, path)
+    for _ in range(args.runs):
+        elapsed, status = await timed_get(client, path)
+        samples.append(elapsed)
+        statuses.append(status)
+    result["warm"] = _scenario(samples, statuses)
+
+    samples, statuses, refreshes = [], [], []
+    backend = reset()
+    await timed_get(client, path)
+    await settle()
+    for _ in range(args.expired_runs):
+        await expire_all(backend)
+        elapsed, status = await timed_get(client, path)
+        samples.append(elapsed)
+        statuses.append(status)
+        refreshes.append(await settle())
+    result["expired"] = _scenario(samples, statuses, refresh=summarize(refreshes))
+
+    # Warm cache, lots of clients at once
+    samples, statuses = [], []
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            elapsed, status = await timed_get(client, path)
+            samples.append(elapsed)
+            statuses.append(status)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - start
+    result["throughput"] = _scenario(samples, statuses, concurrency=args.concurrency,
+                                     requests_per_second=round(len(samples) / wall, 1))
+    return result
+
+@asynccontextmanager
+async def running_app():
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            yield client
+
+def time_calls(fn, setup, runs: int):
+    """Time fn(*setup()) runs times, setup (fresh copies of the input) isn't counted"""
+    samples = []
+    for _ in range(runs):
+        call_args = setup()
+        start = time.perf_counter()
+        fn(*call_args)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_cleaners(responses, season: int, runs: int):
+    from API_Endpoints.season_calendar import process_race_data
+    from API_Endpoints.drivers_cleaner import clean_drivers
+    from API_Endpoints.constructors_cleaner import clean_constructors
+    from API_Endpoints.history import clean_races
+    from API_Endpoints.swr_cache import encode_bodies
+
+    raw = {url: orjson.dumps(payload) for url, payload in responses.items()}
+
+    def fresh(url, *extra):
+        # Some cleaners edit nested dicts in place, every run gets its own copy
+        return lambda: (orjson.loads(raw[url]), *extra)
+
+    def process_calendar(data):
+        return [process_race_data(race) for race in data.get("races", [])]
+
+    cases = {
+        "season_calendar.process_race_data": (process_calendar, SEASON_URL),
+        "drivers_cleaner.clean_drivers": (clean_drivers, DRIVERS_URL),
+        "constructors_cleaner.clean_constructors": (clean_constructors, CONSTRUCTORS_URL),
+        "history.clean_races": (clean_races, f"https://f1api.dev/api/{season - 1}", season - 1),
+    }
+    results = {}
+    for name, (fn, url, *extra) in cases.items():
+        if url in raw:
+            results[name] = time_calls(fn, fresh(url, *extra), runs)
+
+    # Encoding every body (identity, gzip and brotli) happens once per refresh
+    if SEASON_URL in raw:
+        calendar = process_calendar(orjson.loads(raw[SEASON_URL]))
+        results["swr_cache.encode_bodies(races)"] = time_calls(encode_bodies, lambda: (calendar,), runs)
+    return results
+
+def _measure_stage(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = fn()
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples)
+
+    # One more run traced on its own, tracing slows everything down too much to time it
+    tracemalloc.start()
+    try:
+        fn()
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    finally:
+        tracemalloc.stop()
+    return result, output
+
+def bench_map(map_source, fixtures_dir: str, workdir: str, runs: int, load_runs: int):
+    if not map_source:
+        return {"skipped": "No fastf1 session or track layout in the fixtures"}
+
+    from API_Endpoints.map.geometry_store import load_geometry
+    from API_Endpoints.map.map_generator import load_track_geometry, get_track_geometry, generate_track_map
+    from API_Endpoints.map.options import OVERLAYS
+
+    year, gp, session_type = map_source["year"], map_source["gp"], map_source["session"]
+    track = map_source.get("track", gp)
+    stages = {}
+
+    shutil.rmtree(os.path.join(workdir, "track_store"), ignore_errors=True)
+    if map_source.get("geometry"):
+        # Synthetic layout, there's no fastf1 load to measure
+        seed_track_store(fixtures_dir, map_source)
+    else:
+        stages["load_geometry"], (points, features) = _measure_stage(
+            lambda: load_track_geometry(year, gp, session_type), load_runs)
+        stages["load_geometry"]["points"] = len(points)
+        get_track_geometry(year, gp, session_type)
+
+    # What every render after the first starts from
+    stages["load_stored_geometry"], (points, features) = _measure_stage(
+        lambda: load_geometry(year, gp, session_type), runs)
+    stages["load_stored_geometry"]["points"] = len(points)
+
+    variants = {
+        "render_svg": {},
+        "render_svg_overlays": {"overlays": OVERLAYS},
+        "render_png": {"image_format": "png"},
+        "render_webp": {"image_format": "webp"},
+    }
+    for name, options in variants.items():
+        stages[name], output = _measure_stage(
+            lambda: generate_track_map(year, gp, track, session_type, **options), runs)
+        stages[name]["bytes"] = len(output.encode("utf-8") if isinstance(output, str) else output)
+
+    return {"source": map_source, "stages": stages}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+async def run_benchmarks(args, workdir: str):
+    fixtures = load_fixtures(args.fixtures)
+    responses = replay_responses(fixtures)
+    season = int(responses[SEASON_URL]["season"])
+
+    prepare_environment(workdir)
+    enable_fastf1_cache(args.fixtures, offline=True)
+    from API_Endpoints import http_client
+
+    transport = ReplayTransport(responses, latency=args.upstream_latency / 1000)
+    http_client.set_transport(transport)
+
+    results = {
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "fixtures": {"synthetic": fixtures.get("synthetic", False), "dates_as_of": fixtures["dates_as_of"]},
+        "settings": {name: getattr(args, name) for name in
+                     ("runs", "cold_runs", "expired_runs", "requests", "concurrency", "upstream_latency")},
+        "endpoints": {},
+    }
+
+    def reset():
+        backend = reset_caches(workdir)
+        # A cold start still has the layout, same as a server with its track store volume
+        seed_track_store(args.fixtures, fixtures.get("map"))
+        return backend
+
+    if not fixtures.get("map"):
+        print("No fastf1 session or track layout in the fixtures, skipping /f1/next_map/ and map generation")
+    async with running_app() as client:
+        for path in endpoint_paths(season, with_map=bool(fixtures.get("map"))):
+            print(f"Benchmarking {path}")
+            with quiet(args.verbose):
+                results["endpoints"][path] = await bench_endpoint(client, path, transport, reset, args)
+            report_endpoint(path, results["endpoints"][path])
+
+    print("Benchmarking cleaners")
+    with quiet(args.verbose):
+        results["cleaners"] = bench_cleaners(responses, season, args.runs)
+    print("Benchmarking map generation")
+    with quiet(args.verbose):
+        results["map"] = bench_map(fixtures.get("map"), args.fixtures, workdir, args.runs, args.map_load_runs)
+
+    # ru_maxrss is KiB on Linux
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if transport.missing:
+        results["unrecorded_urls"] = sorted(transport.missing)
+    return results
+
+def report_endpoint(path: str, result):
+    for scenario in ("cold", "warm", "expired", "throughput"):
+        r = result[scenario]
+        line = f"  {scenario:<10} p50 {r['p50_ms']:>9.3f} ms  p95 {r['p95_ms']:>9.3f} ms"
+        if "requests_per_second" in r:
+            line += f"  {r['requests_per_second']:>8.1f} req/s"
+        if r.get("errors"):
+            line += f"  {r['errors']} errors"
+        print(line)
+
+def report(results):
+    print("Cleaners:")
+    for name, r in results["cleaners"].items():
+        print(f"  {name:<42} p50 {r['p50_ms']:>9.3f} ms")
+    print("Map:")
+    if "skipped" in results["map"]:
+        print(f"  skipped, {results['map']['skipped']}")
+    for name, r in results["map"].get("stages", {}).items():
+        print(f"  {name:<42} p50 {r['p50_ms']:>9.3f} ms  peak {r['peak_traced_mb']:>7.2f} MB")
+    print(f"Peak RSS {results['peak_rss_mb']} MB")
+
+def _flatten(results, prefix=""):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + " ")
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+def compare(results, baseline, threshold: float):
+    """Metrics that got worse by more than threshold times, as printable lines"""
+    old = dict(_flatten(baseline))
+    regressions = []
+    for name, value in _flatten(results):
+        before = old.get(name)
+        if not before:
+            continue
+        if name.endswith("p50_ms"):
+            # Sub-50µs moves are timer noise
+            worse = value > before * threshold and value - before > 0.05
+        elif name.endswith("requests_per_second"):
+            worse = value * threshold < before
+        else:
+            continue
+        if worse:
+            regressions.append(f"  {name}: {before} -> {value}")
+    return regressions
+
+async def record(args, workdir: str):
+    prepare_environment(workdir)
+    enable_fastf1_cache(args.fixtures, offline=False)
+    from API_Endpoints import http_client
+    from API_Endpoints.current_race_cleaner import get_next_race_data
+    from API_Endpoints.map.geometry_store import load_geometry
+    from API_Endpoints.map.warmup import circuit_gp, map_years
+
+    recorder = RecordingTransport()
+    http_client.set_transport(recorder)
+
+    map_source = None
+    async with running_app() as client:
+        races = (await client.get("/f1/races/")).json()
+        if "season" not in races:
+            raise SystemExit(f"Couldn't record from f1api.dev: {races.get('error', races)}")
+        season = int(races["season"])
+        # The same requests the benchmark makes, so it has everything it will ask for
+        for path in endpoint_paths(season):
+            response = await client.get(path)
+            print(f"{response.status_code} {path}")
+
+        data = await get_next_race_data()
+        race = (data.get("race") or [None])[0]
+        if race:
+            gp = circuit_gp(race)
+            for year in map_years(int(data["season"]), race):
+                if load_geometry(year, gp, "Q") is not None:
+                    map_source = {"year": year, "gp": gp, "session": "Q",
+                                  "track": race.get("circuit", {}).get("circuitName", gp)}
+                    break
+
+    fixtures = save_fixtures(args.fixtures, recorder.responses, map_source)
+    print(f"Recorded {len(fixtures['responses'])} upstream responses to {args.fixtures}")
+    if map_source is None:
+        print("No track map was generated, map benchmarks will be skipped")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["run", "record"], nargs="?", default="run")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--output", help="Results file (defaults to benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="How many times slower than the baseline counts as a regression")
+    parser.add_argument("--runs", type=int, default=50, help="Warm requests and cleaner/render runs")
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--expired-runs", type=int, default=10)
+    parser.add_argument("--map-load-runs", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint in the load test")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-latency", type=float, default=0,
+                        help="Milliseconds each replayed upstream call waits, to mimic the network")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's own output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="f1bench_")
+    try:
+        if args.mode == "record":
+            asyncio.run(record(args, workdir))
+            return
+        results = asyncio.run(run_benchmarks(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Slower than {args.baseline} by more than {args.threshold}x:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
 from fastapi import FastAPI
 
+from API_Endpoints.http_client import open_client, close_client
+from API_Endpoints.cache_backend import init_cache
+
 from API_Endpoints.current_race_cleaner import router as current_race_cleaner
 from API_Endpoints.constructors_cleaner import router as constructors_cleaner
 from API_Endpoints.drivers_cleaner import router as drivers_cleaner
 from API_Endpoints.races_cleaner import router as races_cleaner
-from API_Endpoints.map.router import router as map_router
+from API_Endpoints.map.router import router as map_router, start_map_background, stop_map_background
+from API_Endpoints.stats import router as stats_router
+from API_Endpoints.dashboard import router as dashboard_router
+from API_Endpoints.live import router as live_router, stop_poller
+from API_Endpoints.history import router as history_router
+from API_Endpoints.refresh_scheduler import start_scheduler, stop_scheduler
+from API_Endpoints.metrics import router as metrics_router, MetricsMiddleware
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+# Cache and upstream HTTP client are shared by every router, the scheduler pre-warms
+# caches around race weekends and the map pool preloads fastf1 in the background.
+# All started here rather than in the routers, so each runs exactly once
+@app.on_event("startup")
+async def startup():
+    init_cache()
+    await open_client()
+    start_scheduler()
+    start_map_background()
+
+@app.on_event("shutdown")
+async def shutdown():
+    stop_poller()
+    stop_map_background()
+    await stop_scheduler()
+    await close_client()
 
 # Include all routers
 app.include_router(current_race_cleaner, prefix="/f1/next_race")
@@ -14,3 +41,9 @@ app.include_router(constructors_cleaner, prefix="/f1/constructors_standings")
 app.include_router(drivers_cleaner, prefix="/f1/drivers_standings")
 app.include_router(races_cleaner, prefix="/f1/races")
 app.include_router(map_router, prefix="/f1/next_map")
+app.include_router(dashboard_router, prefix="/f1/dashboard")
+app.include_router(live_router, prefix="/f1/live")
+app.include_router(stats_router, prefix="/f1/stats")
+app.include_router(metrics_router)
+# Last, so /f1/{season}/... never shadows the routes above
+app.include_router(history_router, prefix="/f1")
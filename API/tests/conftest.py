@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+# The app reads its config from the environment at import time, so set it up before any
+# test imports API_Endpoints. Everything it writes goes to a throwaway directory
+_workdir = tempfile.mkdtemp(prefix="glance_f1_tests_")
+os.environ.setdefault("TIMEZONE", "UTC")
+os.environ.setdefault("TRACK_COLOUR", "#e10600")
+os.environ["REFRESH_SCHEDULER"] = "off"
+os.environ["MAP_WARMUP"] = "off"
+for name, path in (("SNAPSHOT_DIR", "snapshots"), ("TRACK_STORE_DIR", "track_store"),
+                   ("HISTORY_DB_PATH", "history.sqlite3"), ("LIVE_DIR", "live"),
+                   ("FASTF1_CACHE_DIR", "fastf1"), ("CACHE_SQLITE_PATH", "cache.sqlite3")):
+    os.environ[name] = os.path.join(_workdir, path)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+from fastapi_cache import FastAPICache
+
+from API_Endpoints import cache_backend, swr_cache
+
+def _backend(name, tmp_path):
+    if name == "sqlite":
+        return cache_backend.SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    if name == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        from fastapi_cache.backends.redis import RedisBackend
+        return RedisBackend(fakeredis.FakeAsyncRedis())
+    return cache_backend.create_backend(name)
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    backend = _backend(request.param, tmp_path)
+    # init is a no-op once set, and the memory backend's store is shared by every instance
+    FastAPICache.reset()
+    FastAPICache.init(backend)
+    if request.param == "memory":
+        backend._store.clear()
+    yield backend
+    FastAPICache.reset()
+
+def test_pack_round_trip():
+    kind, bodies = swr_cache.encode_bodies({"drivers": ["Norris"] * 200})
+    entry = {"kind": kind, "bodies": bodies, "fresh_until": 123.5, "etag": '"abc"', "last_modified": 100.0}
+    unpacked = swr_cache._unpack(swr_cache._pack(entry))
+    assert unpacked == entry
+    assert set(unpacked["bodies"]) >= {"identity", "gzip"}
+
+def test_internal_keys_are_stored_uncompressed(backend, monkeypatch):
+    monkeypatch.setattr(swr_cache, "INTERNAL_KEYS", {"test:internal"})
+    value = {"races": [{"round": 1}] * 50}
+
+    async def build():
+        return value, 3600
+
+    async def run():
+        internal = await swr_cache.get_entry("test:internal", build)
+        served = await swr_cache.get_entry("test:served", build)
+        return internal, served
+
+    internal, served = asyncio.run(run())
+    assert set(internal["bodies"]) == {"identity"}
+    assert set(served["bodies"]) >= {"identity", "gzip"}
+    assert internal["etag"] == served["etag"]
+
+def test_unpack_rejects_old_format():
+    assert swr_cache._unpack(b'{"value": 1}') is None
+
+@pytest.mark.parametrize("value", [{"season": 2026, "races": [{"round": 1}] * 50}, "<svg/>" * 100, b"\x89PNG\r\n"])
+def test_entries_survive_the_backend(backend, value):
+    calls = []
+
+    async def build():
+        calls.append(1)
+        return value, 3600
+
+    async def run():
+        first = await swr_cache.get_entry("test:key", build)
+        # Read back from the backend, not the freshly built entry
+        second = await swr_cache.get_entry("test:key", build)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1
+    assert second["bodies"] == first["bodies"]
+    assert second["etag"] == first["etag"] and second["kind"] == first["kind"]
+    assert swr_cache.entry_value(second) == value
+
+def test_expired_entry_is_served_stale_and_refreshed(backend):
+    values = iter([({"standings": 1}, 3600), ({"standings": 2}, 3600)])
+
+    async def build():
+        return next(values)
+
+    async def run():
+        first = await swr_cache.get_entry("test:stale", build)
+        # Expire it without waiting: same bytes, fresh_until in the past
+        first["fresh_until"] = time.time() - 1
+        await FastAPICache.get_backend().set("test:stale", swr_cache._pack(first), expire=60)
+
+        stale = await swr_cache.get_entry("test:stale", build)
+        await swr_cache._refreshing["test:stale"]
+        refreshed = await swr_cache.get_entry("test:stale", build)
+        return stale, refreshed
+
+    stale, refreshed = asyncio.run(run())
+    assert swr_cache.entry_value(stale) == {"standings": 1}
+    assert swr_cache.entry_value(refreshed) == {"standings": 2}
+    assert refreshed["fresh_until"] > time.time()
+
+def test_errors_are_not_cached(backend):
+    async def build():
+        return {"error": "upstream down"}, 3600
+
+    async def run():
+        entry = await swr_cache.get_entry("test:error", build)
+        return entry, await FastAPICache.get_backend().get("test:error")
+
+    entry, stored = asyncio.run(run())
+    assert entry == {"value": {"error": "upstream down"}}
+    assert stored is None
+
+def test_forget_drops_a_key(backend):
+    async def build():
+        return "<svg/>", 3600
+
+    async def run():
+        await swr_cache.get_entry("track_map:size=400", build)
+        await swr_cache.forget("track_map:size=400")
+        # Forgetting something that's already gone is fine too
+        await swr_cache.forget("track_map:size=400")
+        return await FastAPICache.get_backend().get("track_map:size=400")
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,87 @@
+import time
+from email.utils import formatdate
+
+import pytest
+from starlette.requests import Request
+
+from API_Endpoints import conditional, swr_cache
+
+def _request(**headers):
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+def _entry():
+    kind, bodies = swr_cache.encode_bodies({"races": [{"round": 1, "name": "Australian Grand Prix"}] * 50})
+    return {"kind": kind, "bodies": bodies, "etag": swr_cache.make_etag(bodies["identity"]),
+            "last_modified": 1_700_000_000.0, "fresh_until": time.time() + 3600}
+
+@pytest.mark.parametrize("accept, expected", [
+    ("", "identity"),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.1", "br"),
+    ("*", "br"),
+    ("*;q=0, identity", "identity"),
+    ("br;q=oops, gzip", "gzip"),
+    ("GZIP", "gzip"),
+])
+def test_choose_encoding(accept, expected):
+    assert conditional.choose_encoding(accept, {"identity", "gzip", "br"}) == expected
+
+def test_choose_encoding_only_picks_what_is_stored():
+    assert conditional.choose_encoding("br, gzip", {"identity"}) == "identity"
+    assert conditional.choose_encoding("br, gzip", {"identity", "gzip"}) == "gzip"
+
+def test_each_encoding_gets_its_own_etag_and_body():
+    entry = _entry()
+    identity = conditional.cached_response(_request(), entry)
+    gzip = conditional.cached_response(_request(accept_encoding="gzip"), entry)
+
+    assert identity.headers["etag"] == entry["etag"]
+    assert "content-encoding" not in identity.headers
+    assert identity.body == entry["bodies"]["identity"]
+
+    assert gzip.headers["etag"] == entry["etag"][:-1] + '-gzip"'
+    assert gzip.headers["content-encoding"] == "gzip"
+    assert gzip.body == entry["bodies"]["gzip"]
+    assert gzip.headers["vary"] == "Accept-Encoding"
+
+@pytest.mark.parametrize("if_none_match", [
+    "{etag}",
+    "W/{etag}",
+    "{gzip_etag}",
+    '"nope", W/{gzip_etag}',
+    "*",
+])
+def test_if_none_match_weak_comparison(if_none_match):
+    entry = _entry()
+    header = if_none_match.format(etag=entry["etag"], gzip_etag=entry["etag"][:-1] + '-gzip"')
+    response = conditional.cached_response(_request(if_none_match=header, accept_encoding="br"), entry)
+    assert response.status_code == 304
+    assert response.body == b""
+    # Still says which representation it would have been
+    assert response.headers["etag"] == entry["etag"][:-1] + '-br"'
+
+def test_if_none_match_miss_sends_the_body():
+    response = conditional.cached_response(_request(if_none_match='"somethingelse"'), _entry())
+    assert response.status_code == 200
+
+def test_if_modified_since():
+    entry = _entry()
+    same = conditional.cached_response(_request(if_modified_since=formatdate(entry["last_modified"], usegmt=True)), entry)
+    older = conditional.cached_response(_request(if_modified_since=formatdate(entry["last_modified"] - 60, usegmt=True)), entry)
+    garbage = conditional.cached_response(_request(if_modified_since="yesterday"), entry)
+    assert (same.status_code, older.status_code, garbage.status_code) == (304, 200, 200)
+
+def test_if_none_match_wins_over_if_modified_since():
+    entry = _entry()
+    response = conditional.cached_response(
+        _request(if_none_match='"somethingelse"', if_modified_since=formatdate(entry["last_modified"], usegmt=True)), entry)
+    assert response.status_code == 200
+
+def test_uncached_value_is_sent_without_validators():
+    response = conditional.cached_response(_request(if_none_match="*"), {"value": {"error": "down"}}, status_code=502)
+    assert response.status_code == 502
+    assert response.headers["cache-control"] == "no-cache"
+    assert "etag" not in response.headers
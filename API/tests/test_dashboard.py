@@ -0,0 +1,69 @@
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from API_Endpoints import dashboard
+
+URL = "/f1/dashboard/?sections=races,drivers_standings"
+
+@pytest.fixture
+def client(monkeypatch):
+    FastAPICache.reset()
+    FastAPICache.init(InMemoryBackend())
+    InMemoryBackend._store.clear()
+
+    async def build_races():
+        return {"season": 2026, "races": [{"round": n, "name": f"Round {n}"} for n in range(1, 25)]}, 3600
+
+    async def build_standings():
+        return {"drivers": [{"position": n, "driver": "Norris"} for n in range(1, 21)]}, 3600
+
+    monkeypatch.setattr(dashboard, "SECTIONS", {"races": ("test:races", build_races),
+                                                "drivers_standings": ("test:drivers", build_standings)})
+    monkeypatch.setattr(dashboard, "_bodies", type(dashboard._bodies)())
+    compressions = []
+    real_compress = dashboard.compress_body
+
+    def compress_body(body):
+        compressions.append(body)
+        return real_compress(body)
+    monkeypatch.setattr(dashboard, "compress_body", compress_body)
+
+    app = FastAPI()
+    app.include_router(dashboard.router, prefix="/f1/dashboard")
+    with TestClient(app) as client:
+        yield client, compressions
+    FastAPICache.reset()
+
+def test_dashboard_is_compressed_once_and_negotiated(client):
+    client, compressions = client
+    identity = client.get(URL, headers={"Accept-Encoding": "identity"})
+    assert identity.headers.get("content-encoding") is None
+    data = identity.json()
+    assert data["races"]["season"] == 2026 and len(data["drivers_standings"]["drivers"]) == 20
+
+    br = client.get(URL, headers={"Accept-Encoding": "br"})
+    assert br.headers["content-encoding"] == "br"
+    assert br.headers["etag"] == identity.headers["etag"][:-1] + '-br"'
+    assert orjson.loads(br.content) == data
+
+    gz = client.get(URL, headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.json() == data
+
+    # Same sections and nothing changed: one compression between all of them
+    assert len(compressions) == 1
+
+    revalidated = client.get(URL, headers={"Accept-Encoding": "br", "If-None-Match": br.headers["etag"]})
+    assert revalidated.status_code == 304
+
+def test_each_section_combination_gets_its_own_body(client):
+    client, compressions = client
+    both = client.get(URL, headers={"Accept-Encoding": "br"})
+    races = client.get("/f1/dashboard/?sections=races", headers={"Accept-Encoding": "br"})
+    assert both.headers["etag"] != races.headers["etag"]
+    assert list(races.json()) == ["races"]
+    assert len(compressions) == 2
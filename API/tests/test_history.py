@@ -0,0 +1,50 @@
+import asyncio
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from API_Endpoints import history, swr_cache
+
+def _init_cache():
+    FastAPICache.reset()
+    FastAPICache.init(InMemoryBackend())
+    InMemoryBackend._store.clear()
+
+def test_current_season_is_decoded_once_per_stored_calendar(monkeypatch):
+    _init_cache()
+    builds = []
+    decodes = []
+
+    async def build_season_calendar():
+        builds.append(1)
+        return {"season": 2026, "races": []}, 3600
+
+    real_entry_value = history.entry_value
+
+    def entry_value(entry):
+        decodes.append(1)
+        return real_entry_value(entry)
+
+    async def get_season_calendar_entry():
+        return await swr_cache.get_entry("test:calendar", build_season_calendar)
+
+    monkeypatch.setattr(history, "get_season_calendar_entry", get_season_calendar_entry)
+    monkeypatch.setattr(history, "entry_value", entry_value)
+    monkeypatch.setattr(history, "_current_season", (None, None))
+
+    async def run():
+        return [await history.current_season() for _ in range(5)]
+
+    assert asyncio.run(run()) == [2026] * 5
+    assert len(builds) == 1
+    # Hits after the first see the same fresh_until and never look inside the calendar
+    assert len(decodes) == 1
+
+def test_empty_season_is_a_404(monkeypatch):
+    async def fetch_json(resource, url, snapshot=True):
+        return {"season": 1951, "races": []}, True
+
+    monkeypatch.setattr(history, "fetch_json", fetch_json)
+    entry = asyncio.run(history.ingest(1951, "races"))
+    assert entry["status"] == 404
+    assert "No races data for 1951" in entry["value"]["error"]
@@ -0,0 +1,136 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+from API_Endpoints import live
+from conftest import FIXTURES_DIR
+
+REPLAY_FILE = os.path.join(FIXTURES_DIR, "live_replay.txt")
+
+NEXT_EVENT = {"session": "Race", "date": "2099-09-07", "time": "13:00:00Z", "datetime": "2099-09-07T13:00:00+00:00"}
+
+def _decode(message: bytes):
+    event, data = message.decode().strip().split("\n")
+    assert event == "event: state"
+    return orjson.loads(data[len("data: "):])
+
+def test_parse_line_skips_unused_categories_and_decodes_initial_state():
+    with open(REPLAY_FILE) as f:
+        lines = f.read().splitlines()
+
+    category, message, timestamp = live.parse_line(lines[0])
+    assert category == "SessionInfo"
+    assert message["Meeting"]["Name"] == "Italian Grand Prix"
+    assert timestamp == ""
+
+    assert live.parse_line(lines[5]) is None  # CarData.z
+    assert live.parse_line(lines[-1]) is None  # cut off mid-line
+
+def test_replay_merges_partial_updates():
+    source = live.ReplaySource(REPLAY_FILE, speed=1e6)
+    state = {}
+    while source.position < len(source.messages):
+        for category, message, _ in source.read():
+            live.apply_message(state, category, message)
+
+    snapshot = live.build_snapshot(state, None)
+    assert snapshot["session"] == {"meeting": "Italian Grand Prix", "name": "Race", "type": "Race",
+                                   "status": "Started", "track_status": "AllClear", "lap": 2, "total_laps": 53}
+    assert snapshot["standings"] == [
+        {"position": 1, "number": "4", "driver": "NOR", "gap": None},
+        {"position": 2, "number": "1", "driver": "VER", "gap": "+0.3"},
+        {"position": 3, "number": "16", "driver": "LEC", "gap": "+1.9"},
+    ]
+
+def test_replay_holds_back_messages_until_their_time():
+    source = live.ReplaySource(REPLAY_FILE, speed=0.001)
+    # Initial state and the first timestamped message only, the rest is seconds away
+    assert [category for category, _, _ in source.read()] == ["SessionInfo", "DriverList", "SessionStatus"]
+    assert source.read() == []
+
+def test_poll_loop_fans_out_state_and_position_changes(monkeypatch):
+    monkeypatch.setattr(live, "LIVE_REPLAY_FILE", REPLAY_FILE)
+    # Recording covers 2.5s, played back in ~0.25s
+    monkeypatch.setattr(live, "LIVE_REPLAY_SPEED", 10)
+    monkeypatch.setattr(live, "POLL_SECONDS", 0.01)
+
+    async def get_next_race_entry():
+        return {"value": {"next_event": NEXT_EVENT}, "fresh_until": 4102444800.0}
+    monkeypatch.setattr(live, "get_next_race_entry", get_next_race_entry)
+
+    async def collect(queue, received):
+        while True:
+            message = await queue.get()
+            received.append(message)
+            if _decode(message)["session"]["lap"] == 2:
+                return
+
+    async def run():
+        first, second = live._subscribe(), live._subscribe()
+        try:
+            received = ([], [])
+            await asyncio.wait_for(asyncio.gather(collect(first, received[0]), collect(second, received[1])), 5)
+            # A late joiner gets the current state straight away
+            late = live._subscribe()
+            late_state = _decode(late.get_nowait())
+            live._unsubscribe(late)
+            return received, late_state
+        finally:
+            live._unsubscribe(first)
+            live._unsubscribe(second)
+
+    (first, second), late_state = asyncio.run(run())
+
+    # Both subscribers were sent the very same bytes
+    assert first[-1] == second[-1]
+    states = [_decode(message) for message in first]
+    assert all(state["next_event"]["seconds_remaining"] > 0 for state in states)
+    changes = [change for state in states for change in state["changes"]]
+    assert {"driver": "NOR", "from": 2, "to": 1} in changes
+    assert {"driver": "VER", "from": 1, "to": 2} in changes
+    assert states[-1]["standings"][0]["driver"] == "NOR"
+
+    assert late_state["changes"] == []
+    assert late_state["standings"] == states[-1]["standings"]
+    # Nobody left watching, the poller is stopped
+    assert live._poller is None and not live._subscribers
+
+def test_schedule_is_only_decoded_again_when_a_new_copy_is_stored(monkeypatch):
+    now = datetime.now(timezone.utc)
+    calendar = {"season": 2026, "races": [{"round": 16, "schedule": {
+        "fp1": {"datetime_rfc3339": (now - timedelta(minutes=10)).isoformat()},
+        "race": {"datetime_rfc3339": (now + timedelta(days=2)).isoformat()},
+    }}]}
+    entries = {"calendar": {"value": calendar, "fresh_until": 1000.0},
+               "next_race": {"value": {"next_event": NEXT_EVENT}, "fresh_until": 2000.0}}
+    decodes = []
+
+    async def get_season_calendar_entry():
+        return dict(entries["calendar"])
+
+    async def get_next_race_entry():
+        return dict(entries["next_race"])
+
+    def entry_value(entry):
+        decodes.append(entry["fresh_until"])
+        return entry["value"]
+
+    monkeypatch.setattr(live, "get_season_calendar_entry", get_season_calendar_entry)
+    monkeypatch.setattr(live, "get_next_race_entry", get_next_race_entry)
+    monkeypatch.setattr(live, "entry_value", entry_value)
+    monkeypatch.setattr(live, "_windows", (None, []))
+    monkeypatch.setattr(live, "_next_event", (None, None))
+
+    async def poll(times):
+        return [(await live.current_session_key(), await live.current_next_event()) for _ in range(times)]
+
+    assert asyncio.run(poll(5)) == [("2026_16_fp1", NEXT_EVENT)] * 5
+    assert sorted(decodes) == [1000.0, 2000.0]
+
+    # Calendar refreshed and the session moved: picked up on the next poll
+    calendar["races"][0]["schedule"]["fp1"]["datetime_rfc3339"] = (now + timedelta(days=1)).isoformat()
+    entries["calendar"]["fresh_until"] = 1500.0
+    assert asyncio.run(poll(3)) == [(None, NEXT_EVENT)] * 3
+    assert sorted(decodes) == [1000.0, 1500.0, 2000.0]
@@ -0,0 +1,35 @@
+import pytest
+
+from API_Endpoints.settings import Settings
+
+BASE = {"TIMEZONE": "Europe/London", "TRACK_COLOUR": "#e10600"}
+
+def test_defaults():
+    settings = Settings(BASE)
+    assert settings.upstream_timeout == 5.0 and settings.upstream_retries == 2
+    assert settings.cache_backend == "memory"
+    assert settings.map_warmup is False and settings.refresh_scheduler is True
+    assert settings.fastf1_cache_max_mb == 2048
+    assert settings.snapshot_dir == "data/snapshots"
+
+def test_values_are_parsed_and_trimmed():
+    settings = Settings(dict(BASE, UPSTREAM_TIMEOUT=" 2.5 ", MAP_WORKERS="4", CACHE_BACKEND="SQLite",
+                             MAP_WARMUP="on", REFRESH_SCHEDULER="false", LIVE_DIR=" /data/live "))
+    assert settings.upstream_timeout == 2.5
+    assert settings.map_workers == 4
+    assert settings.cache_backend == "sqlite"
+    assert settings.map_warmup is True and settings.refresh_scheduler is False
+    assert settings.live_dir == "/data/live"
+
+@pytest.mark.parametrize("name, value, message", [
+    ("UPSTREAM_RETRIES", "two", "UPSTREAM_RETRIES must be a whole number"),
+    ("UPSTREAM_TIMEOUT", "5s", "UPSTREAM_TIMEOUT must be a number"),
+    ("MAP_WORKERS", "0", "MAP_WORKERS must be at least 1"),
+    ("FASTF1_CACHE_MAX_MB", "-1", "FASTF1_CACHE_MAX_MB must be at least 0"),
+    ("MAP_WARMUP", "maybe", "MAP_WARMUP must be on or off"),
+    ("CACHE_BACKEND", "memcached", "CACHE_BACKEND"),
+    ("TIMEZONE", "Mars/Olympus", "Invalid time zone"),
+])
+def test_bad_values_name_the_variable(name, value, message):
+    with pytest.raises(ValueError, match=message):
+        Settings(dict(BASE, **{name: value}))
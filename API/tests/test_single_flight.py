@@ -0,0 +1,87 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from API_Endpoints import single_flight
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(single_flight, "_inflight", {})
+    monkeypatch.setattr(single_flight, "_stats", defaultdict(lambda: {"origin": 0, "coalesced": 0}))
+
+def test_concurrent_misses_share_one_origin_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"season": 2026}
+
+    async def run():
+        return await asyncio.gather(*(single_flight.do("f1:next_race", fetch) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{"season": 2026}] * 10
+    assert single_flight.get_stats() == {"f1:next_race": {"origin": 1, "coalesced": 9, "in_flight": False}}
+
+def test_next_call_after_completion_goes_to_the_origin_again():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return [await single_flight.do("drivers_championship", fetch) for _ in range(3)]
+
+    assert asyncio.run(run()) == [1, 2, 3]
+    assert single_flight.get_stats()["drivers_championship"]["coalesced"] == 0
+
+def test_error_reaches_every_waiter_and_isnt_kept():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        results = await asyncio.gather(*(single_flight.do("f1:all_races", failing) for _ in range(5)),
+                                       return_exceptions=True)
+        # Nothing left in flight, a retry starts a new call
+        retry = await asyncio.gather(single_flight.do("f1:all_races", failing), return_exceptions=True)
+        return results, retry
+
+    results, retry = asyncio.run(run())
+    assert len(results) == 5 and all(isinstance(r, RuntimeError) for r in results)
+    assert isinstance(retry[0], RuntimeError)
+    assert len(calls) == 2
+
+def test_cancelled_waiter_doesnt_cancel_the_shared_call():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(single_flight.do("k", fetch))
+        second = asyncio.ensure_future(single_flight.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+def test_stats_key_groups_callers():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "<svg/>"
+
+    async def run():
+        await asyncio.gather(single_flight.do("track_map:size=400", fetch, "track_map_variant"),
+                             single_flight.do("track_map:size=400", fetch, "track_map_variant"),
+                             single_flight.do("track_map:size=800", fetch, "track_map_variant"))
+
+    asyncio.run(run())
+    assert single_flight.get_stats() == {"track_map_variant": {"origin": 2, "coalesced": 1, "in_flight": False}}
@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+import pytest
+
+from API_Endpoints import http_client, upstream
+
+URL = "https://f1api.dev/api/current"
+HOST = "f1api.dev"
+
+@pytest.fixture
+def responses(monkeypatch, tmp_path):
+    """Queue of (status, body) upstream answers, plus the list of requests that reached it"""
+    queue = []
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        status, body = queue.pop(0) if queue else (500, b"")
+        if isinstance(status, Exception):
+            raise status
+        return httpx.Response(status, content=body)
+
+    monkeypatch.setattr(upstream, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(upstream, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(upstream, "_breakers", {})
+    http_client.set_transport(httpx.MockTransport(handler))
+    http_client._client = None
+    yield queue, seen
+    http_client.set_transport(None)
+    http_client._client = None
+
+def _fetch(resource="season_calendar", snapshot=True):
+    return asyncio.run(upstream.fetch_json(resource, URL, snapshot=snapshot))
+
+def test_retries_then_succeeds_and_keeps_a_snapshot(responses):
+    queue, seen = responses
+    queue.extend([(503, b""), (200, b'{"season": 2026}')])
+
+    assert _fetch() == ({"season": 2026}, True)
+    assert len(seen) == 2
+    assert upstream._read_snapshot("season_calendar") == {"season": 2026}
+
+def test_snapshot_is_served_after_one_failed_attempt(responses):
+    queue, seen = responses
+    queue.append((200, b'{"season": 2026}'))
+    _fetch()
+
+    seen.clear()
+    queue.append((httpx.ConnectTimeout("timed out"), None))
+    assert _fetch() == ({"season": 2026}, False)
+    # No retries while there's something to show
+    assert len(seen) == 1
+
+def test_no_snapshot_retries_then_raises(responses):
+    _, seen = responses
+    with pytest.raises(upstream.UpstreamError):
+        _fetch(snapshot=False)
+    assert len(seen) == upstream.UPSTREAM_RETRIES + 1
+
+def test_retry_budget_caps_a_call(responses, monkeypatch):
+    _, seen = responses
+    monkeypatch.setattr(upstream, "UPSTREAM_RETRY_BUDGET", 0)
+    with pytest.raises(upstream.UpstreamError):
+        _fetch(snapshot=False)
+    assert seen == []
+
+def test_not_found_leaves_the_breaker_alone(responses):
+    queue, seen = responses
+    queue.extend([(404, b"")] * 5)
+    for _ in range(5):
+        with pytest.raises(upstream.UpstreamNotFound):
+            _fetch("1949_races", snapshot=False)
+    assert len(seen) == 5
+    assert not upstream.breaker_open(HOST)
+
+def test_breaker_opens_and_half_opens(responses):
+    queue, seen = responses
+    for _ in range(upstream.BREAKER_THRESHOLD):
+        with pytest.raises(upstream.UpstreamError):
+            _fetch(snapshot=False)
+    assert upstream.breaker_open(HOST)
+
+    # Open: nothing goes upstream at all
+    seen.clear()
+    with pytest.raises(upstream.UpstreamError, match="circuit open"):
+        _fetch(snapshot=False)
+    assert seen == []
+
+    # Cool-down over, one failed trial call opens it straight back up
+    upstream._breakers[HOST]["open_until"] = 0.0
+    with pytest.raises(upstream.UpstreamError):
+        _fetch(snapshot=False)
+    assert upstream.breaker_open(HOST)
+
+    # And a successful one closes it
+    upstream._breakers[HOST]["open_until"] = 0.0
+    queue.append((200, b'{"season": 2026}'))
+    assert _fetch(snapshot=False) == ({"season": 2026}, True)
+    assert upstream._breakers[HOST] == {"failures": 0, "open_until": 0.0}
+
+def test_open_breaker_falls_back_to_the_snapshot(responses):
+    queue, seen = responses
+    queue.append((200, b'{"season": 2026}'))
+    _fetch()
+
+    upstream._breakers[HOST] = {"failures": upstream.BREAKER_THRESHOLD, "open_until": float("inf")}
+    seen.clear()
+    assert _fetch() == ({"season": 2026}, False)
+    assert seen == []